@@ -14,6 +14,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
 SRC_DIR = os.path.join(BASE_DIR, "src")
 
 print(f"项目根目录: {BASE_DIR}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+AST遍历微基准 - 对比 ast.walk + isinstance 链 与 单次分派遍历
+"""
+
+import os
+import sys
+import ast
+import time
+import argparse
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from static_analysis.ast_analyzer import FlaskASTAnalyzer, _StructureCollector, list_python_files
+
+def walk_legacy(analyzer, tree, file_path):
+    """原实现：ast.walk 全量遍历 + isinstance 判断"""
+    result = {"function_details": [], "class_details": [], "import_details": []}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            result["function_details"].append(analyzer._analyze_function(node, file_path))
+        elif isinstance(node, ast.ClassDef):
+            methods = [item.name for item in node.body if isinstance(item, ast.FunctionDef)]
+            class_info = analyzer._analyze_class(node, file_path)
+            class_info["methods"] = len(methods)
+            class_info["method_names"] = methods[:5]
+            result["class_details"].append(class_info)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            result["import_details"].append(analyzer._analyze_import(node, file_path))
+    return result
+
+def walk_single_pass(analyzer, tree, file_path):
+    """新实现：单次分派遍历"""
+    result = {"function_details": [], "class_details": [], "import_details": []}
+    _StructureCollector(analyzer, file_path, result).visit(tree)
+    return result
+
+def benchmark(directory, repeat=5):
+    """对目录下每个文件分别计时（不含读取和解析）"""
+    analyzer = FlaskASTAnalyzer()
+    trees = []
+    for file_path in list_python_files(directory):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                trees.append((file_path, ast.parse(f.read())))
+        except Exception as e:
+            print(f"解析文件失败 {file_path}: {e}")
+
+    timings = {}
+    for name, walker in (("legacy", walk_legacy), ("single_pass", walk_single_pass)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for file_path, tree in trees:
+                result = walker(analyzer, tree, file_path)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    # 统计两种方式收集到的记录数
+    legacy_funcs = sum(len(walk_legacy(analyzer, t, p)["function_details"]) for p, t in trees)
+    new_funcs = sum(len(walk_single_pass(analyzer, t, p)["function_details"]) for p, t in trees)
+
+    files = max(len(trees), 1)
+    print(f"目录: {directory}")
+    print(f"文件数: {len(trees)}，重复次数: {repeat}（取最优）")
+    print(f"ast.walk + isinstance: {timings['legacy'] / files * 1e6:.1f} µs/文件")
+    print(f"单次分派遍历:          {timings['single_pass'] / files * 1e6:.1f} µs/文件")
+    print(f"加速比: {timings['legacy'] / timings['single_pass']:.2f}x")
+    print(f"函数记录数: {legacy_funcs} → {new_funcs}（新增的为async函数）")
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AST遍历微基准")
+    parser.add_argument("directory", help="要分析的源码目录，例如 data/raw/flask_repos/flask_3.0.0")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.directory, args.repeat)
@@ -29,8 +29,12 @@ except ImportError as e:
     project_root = os.path.dirname(script_dir)
     RAW_DATA_DIR = os.path.join(project_root, "data", "raw")
 
-def download_flask_versions():
-    """下载指定版本的Flask源码"""
+def download_flask_versions(copy_versions=True):
+    """下载指定版本的Flask源码
+    
+    copy_versions为False时只克隆/更新主仓库，不再逐个检出复制版本目录；
+    静态分析可通过 run_static_analysis.py --from-git 直接读取git对象。
+    """
     print("开始下载Flask源码...")
     print(f"目标版本: {FLASK_VERSIONS}")
     
@@ -55,6 +59,10 @@ def download_flask_versions():
         tags = [tag.name for tag in repo.tags]
         print(f"仓库共有 {len(tags)} 个标签")
         
+        if not copy_versions:
+            print("跳过版本目录复制，可使用 run_static_analysis.py --from-git 直接分析")
+            return True
+        
         # 处理每个目标版本
         for version in FLASK_VERSIONS:
             if version not in tags:
@@ -103,4 +111,4 @@ def download_flask_versions():
         return False
 
 if __name__ == "__main__":
-    download_flask_versions()
\ No newline at end of file
+    download_flask_versions(copy_versions="--no-copy" not in sys.argv[1:])
\ No newline at end of file
@@ -9,6 +9,13 @@ import json
 import sys
 from datetime import datetime
 
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from static_analysis.columnar_store import has_columnar, load_totals
+from static_analysis.complexity_metrics import FunctionMetrics, complexity_trends
+
 def safe_int(value, default=0):
     """安全转换为整数"""
     try:
@@ -35,11 +42,29 @@ def generate_report():
     for item in os.listdir(analysis_dir):
         item_path = os.path.join(analysis_dir, item)
         detailed_file = os.path.join(item_path, "ast_analysis_detailed.json")
+        summary_file = os.path.join(item_path, "ast_analysis_summary.json")
+        columnar_dir = os.path.join(item_path, "ast_columnar")
         
-        if os.path.isdir(item_path) and os.path.exists(detailed_file):
+        if os.path.isdir(item_path) and (has_columnar(columnar_dir) or os.path.exists(detailed_file)
+                                         or os.path.exists(summary_file)):
             try:
-                with open(detailed_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                # 摘要文件每次分析都会重写，优先使用其中的汇总数；
+                # 旧版本的摘要没有汇总数时再读列式清单或详细JSON
+                summary = {}
+                if os.path.exists(summary_file):
+                    with open(summary_file, 'r', encoding='utf-8') as f:
+                        summary = json.load(f)
+                if "total_functions" in summary:
+                    data = {**summary, "files_analyzed": summary.get("total_files", 0)}
+                elif has_columnar(columnar_dir):
+                    # 列式存储只需读取清单中的汇总数，无需解析明细
+                    data = load_totals(columnar_dir)
+                elif os.path.exists(detailed_file):
+                    with open(detailed_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                else:
+                    print(f"跳过 {item}: 摘要中没有汇总数，请重新运行静态分析")
+                    continue
                 
                 # 从详细数据中提取关键信息
                 version_data[item] = {
@@ -52,7 +77,7 @@ def generate_report():
                 }
                 version_dirs.append(item)
             except Exception as e:
-                print(f"读取 {detailed_file} 失败: {e}")
+                print(f"读取 {item_path} 失败: {e}")
     
     # 按版本号排序
     def version_sort_key(version_str):
@@ -72,6 +97,8 @@ def generate_report():
         "总体统计": {},
         "主要发现": [],
         "版本演化趋势": [],
+        "复杂度趋势": {},
+        "复杂度热点": [],
         "建议": []
     }
     
@@ -142,6 +169,18 @@ def generate_report():
         
         report["主要发现"].append(f"从 {first_version} 到 {last_version}，函数总数变化: {total_func_change}，类总数变化: {total_class_change}")
     
+    # 复杂度趋势（需要包含复杂度字段的分析结果）
+    version_metrics = {}
+    for version in version_dirs:
+        try:
+            version_metrics[version] = FunctionMetrics.from_version_dir(os.path.join(analysis_dir, version))
+        except Exception as e:
+            print(f"读取 {version} 复杂度指标失败: {e}")
+    for version, trend in complexity_trends(version_metrics).items():
+        report["复杂度趋势"][version.replace("flask_", "")] = trend
+    if version_dirs and version_metrics.get(version_dirs[-1]) is not None:
+        report["复杂度热点"] = version_metrics[version_dirs[-1]].top("complexity", 10)
+    
     # 添加建议
     report["建议"] = [
         "Flask代码库规模适中，函数密度较高，建议进行代码复杂度分析",
@@ -182,6 +221,27 @@ def generate_report():
         for key, value in trend.items():
             md_content += f"- **{key}**: 函数增长 {value['函数增长']} ({value['函数增长百分比']})，类增长 {value['类增长']} ({value['类增长百分比']})\n"
     
+    if report["复杂度趋势"]:
+        md_content += f"""
+##  复杂度趋势
+
+| 版本 | 函数数 | 平均圈复杂度 | P90 | 最大 | 平均认知复杂度 | 最大嵌套深度 | 复杂函数占比(>10) |
+|------|--------|--------------|-----|------|----------------|--------------|-------------------|
+"""
+        for version, trend in report["复杂度趋势"].items():
+            cc = trend["complexity"]
+            md_content += (f"| {version} | {trend['functions']} | {cc.get('mean', 0)} | {cc.get('p90', 0)} | "
+                           f"{cc.get('max', 0)} | {trend['cognitive'].get('mean', 0)} | "
+                           f"{trend['max_nesting'].get('max', 0)} | {trend['complex_share'] * 100:.1f}% |\n")
+    
+    if report["复杂度热点"]:
+        md_content += f"""
+### 最新版本复杂度热点
+
+"""
+        for item in report["复杂度热点"]:
+            md_content += f"- `{item['name']}` ({item['file']}:{item['line']}) 圈复杂度 {item['complexity']}\n"
+    
     md_content += f"""
 ##  建议
 
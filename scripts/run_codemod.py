@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+批量代码改写脚本 - 对一个或多个版本目录运行LibCST转换链
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+def parse_args():
+    """解析命令行参数"""
+    from static_analysis.libcst_modifier import TRANSFORM_PASSES
+    
+    parser = argparse.ArgumentParser(description="LibCST批量代码改写工具")
+    parser.add_argument("directories", nargs="+", help="要改写的版本目录（文件将被原地修改）")
+    parser.add_argument("--pass", dest="passes", action="append", choices=sorted(TRANSFORM_PASSES),
+                        required=True, help="依次运行的转换pass，可多次指定")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数（默认串行）")
+    parser.add_argument("--dry-run", action="store_true", help="只输出diff，不写回文件")
+    parser.add_argument("--diff-dir", default=None, help="把每个目录的完整diff写入该目录")
+    parser.add_argument("--no-state", action="store_true", help="不记录/跳过已处理文件的哈希")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    try:
+        import config
+        CACHE_DIR = config.CACHE_DIR
+    except (ImportError, AttributeError):
+        CACHE_DIR = os.path.join(project_root, "data", "cache")
+    
+    from static_analysis.codemod_runner import run_codemod
+    
+    state_dir = None if args.no_state else os.path.join(CACHE_DIR, "codemod")
+    results = run_codemod(args.directories, args.passes, workers=args.workers,
+                          state_dir=state_dir, dry_run=args.dry_run, diff_dir=args.diff_dir)
+    
+    total_changed = sum(r["files_changed"] for r in results.values())
+    total_seconds = sum(r["seconds"] for r in results.values())
+    print(f"\n共 {len(results)} 个目录，修改 {total_changed} 个文件，耗时 {total_seconds:.2f}s")
+    if args.diff_dir:
+        with open(os.path.join(args.diff_dir, "summary.json"), 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return results
+
+if __name__ == "__main__":
+    main()
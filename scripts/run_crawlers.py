@@ -6,11 +6,14 @@
 
 import os
 import sys
-import subprocess
 import json
 import pandas as pd
 from datetime import datetime
 
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
 def main():
     print("数据爬取脚本")
     print("=" * 50)
@@ -33,33 +36,27 @@ def main():
     repo_path = os.path.join(RAW_DATA_DIR, "flask_main")
     
     if os.path.exists(repo_path):
-        # 提取最近100条提交
-        cmd = ["git", "log", "--pretty=format:%H|%an|%ae|%ad|%s", 
-               "--date=format:%Y-%m-%d %H:%M:%S", "--max-count=100"]
+        from crawler.git_extractor import update_commits
+        
+        output_dir = os.path.join(RAW_DATA_DIR, "git_logs_raw")
+        history_file = os.path.join(output_dir, "commits_full.csv")
+        fields = (("hash", "%H"), ("author", "%an"), ("email", "%ae"), ("date", "%ad"), ("message", "%s"))
         
         try:
-            result = subprocess.run(cmd, cwd=repo_path, capture_output=True, text=True, encoding='utf-8')
+            # 增量提取全部提交历史：只提取上次运行之后的新提交，历史被改写时自动完整重建
+            mode, new_count, total = update_commits(repo_path, history_file, fields=fields,
+                                                    date="format:%Y-%m-%d %H:%M:%S")
+            print(f" 提交历史: {history_file} ({mode}，新增 {new_count} 条，共 {total} 条)")
             
-            commits = []
-            for line in result.stdout.strip().split("\n"):
-                if line:
-                    parts = line.split("|", 4)
-                    if len(parts) == 5:
-                        commits.append({
-                            "hash": parts[0],
-                            "author": parts[1],
-                            "email": parts[2],
-                            "date": parts[3],
-                            "message": parts[4]
-                        })
+            # 取最近100条提交做样本统计（文件按从新到旧排列）
+            commits = pd.read_csv(history_file, encoding='utf-8-sig', nrows=100,
+                                  dtype=str, keep_default_na=False).to_dict("records")
             
             if commits:
                 df = pd.DataFrame(commits)
                 df['date'] = pd.to_datetime(df['date'])
                 
                 # 保存
-                output_dir = os.path.join(RAW_DATA_DIR, "git_logs_raw")
-                os.makedirs(output_dir, exist_ok=True)
                 df.to_csv(os.path.join(output_dir, "commits_sample.csv"), index=False, encoding='utf-8')
                 
                 # 基本统计
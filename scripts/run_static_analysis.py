@@ -7,13 +7,56 @@
 import os
 import sys
 import json
+import argparse
 from datetime import datetime
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(project_root, "src"))
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Flask静态分析工具")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="AST分析使用的进程数（默认串行）")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="对比串行与并行AST分析、LibCST分析的耗时")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="禁用按内容哈希的AST结果缓存和LibCST解析缓存")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="逐个版本分析，不做跨版本的文件去重")
+    parser.add_argument("--index", action="store_true",
+                        help="同时把分析结果写入SQLite符号索引（symbols.db）")
+    parser.add_argument("--call-graph", action="store_true",
+                        help="为每个版本构建（增量更新）静态调用图")
+    parser.add_argument("--import-graph", action="store_true",
+                        help="为每个版本构建模块依赖图，并对比相邻版本的依赖边")
+    parser.add_argument("--structure", action="store_true",
+                        help="同时计算函数/类/文件的结构哈希，演化报告中给出结构变化和移动的函数")
+    parser.add_argument("--libcst-metadata", action="store_true",
+                        help="LibCST模式查找按完整限定名识别调用（可识别别名导入，首次运行较慢）")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="LibCST分析不做token预过滤，解析全部文件")
+    parser.add_argument("--check-prefilter", action="store_true",
+                        help="完整分析被预过滤跳过的文件，确认结果与不过滤时一致")
+    parser.add_argument("--from-git", action="store_true",
+                        help="直接从 flask_main 的git对象读取各版本源码，无需下载复制")
+    parser.add_argument("--commit-series", action="store_true",
+                        help="沿 flask_main 的全部提交生成逐提交的函数/类/复杂度序列（只重新分析改动的文件）")
+    parser.add_argument("--first-parent", action="store_true",
+                        help="逐提交序列只沿主线（first-parent）提交")
+    parser.add_argument("--function-churn", action="store_true",
+                        help="沿 flask_main 的提交历史统计每个函数的变更次数、增删行数和作者")
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument("--stream", action="store_true",
+                              help="以JSONL流式写出明细记录（ast_analysis_detailed.jsonl）")
+    output_group.add_argument("--columnar", action="store_true",
+                              help="以Parquet列式存储写出明细记录（需要pyarrow）")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("=" * 60)
     print("Flask静态分析工具")
     print("=" * 60)
@@ -23,56 +66,144 @@ def main():
         import config
         RAW_DATA_DIR = config.RAW_DATA_DIR
         PROCESSED_DATA_DIR = config.PROCESSED_DATA_DIR
-    except ImportError:
+        CACHE_DIR = config.CACHE_DIR
+        FLASK_VERSIONS = config.FLASK_VERSIONS
+    except (ImportError, AttributeError):
         RAW_DATA_DIR = os.path.join(project_root, "data", "raw")
         PROCESSED_DATA_DIR = os.path.join(project_root, "data", "processed")
+        CACHE_DIR = os.path.join(project_root, "data", "cache")
+        FLASK_VERSIONS = ["2.0.0", "2.1.0", "2.2.0", "2.3.0", "3.0.0"]
     
     repos_dir = os.path.join(RAW_DATA_DIR, "flask_repos")
+    main_repo_path = os.path.join(RAW_DATA_DIR, "flask_main")
     output_dir = os.path.join(PROCESSED_DATA_DIR, "static_analysis")
     
-    if not os.path.exists(repos_dir):
+    if args.from_git:
+        if not os.path.exists(main_repo_path):
+            print(f"Flask仓库不存在: {main_repo_path}")
+            print("请先运行: python scripts/download_flask_versions.py --no-copy")
+            return
+        from static_analysis.git_source import GitBlobSource
+        git_source = GitBlobSource(main_repo_path)
+        print(f"源码仓库: {main_repo_path} (标签: {FLASK_VERSIONS})")
+    elif not os.path.exists(repos_dir):
         print(f"Flask源码目录不存在: {repos_dir}")
         print("请先运行: python scripts/download_flask_versions.py")
         return
-    
-    print(f"源码目录: {repos_dir}")
+    else:
+        print(f"源码目录: {repos_dir}")
     print(f"输出目录: {output_dir}")
     
     # 1. 使用AST分析
     print("\n[1/3] 使用AST分析代码结构...")
     try:
-        from static_analysis.ast_analyzer import analyze_flask_version
+        from static_analysis.ast_analyzer import (analyze_flask_version, analyze_flask_versions,
+                                                  analyze_flask_tags, compare_serial_parallel,
+                                                  ANALYZER_VERSION)
+        from static_analysis.analysis_cache import AnalysisCache
         
-        version_dirs = [d for d in os.listdir(repos_dir) 
-                       if os.path.isdir(os.path.join(repos_dir, d))]
+        cache = None
+        if not args.no_cache:
+            cache = AnalysisCache(os.path.join(CACHE_DIR, "ast"), ANALYZER_VERSION)
+        
+        index = None
+        if args.index:
+            from static_analysis.symbol_index import SymbolIndex
+            index = SymbolIndex(os.path.join(output_dir, "symbols.db"))
         
         results = {}
-        for version_dir in version_dirs:
-            if version_dir.startswith("flask_"):
-                full_path = os.path.join(repos_dir, version_dir)
-                summary = analyze_flask_version(full_path, output_dir)
-                results[version_dir] = summary
+        if args.from_git:
+            # 直接从git对象读取，blob哈希天然去重
+            results, dedup_stats = analyze_flask_tags(git_source, FLASK_VERSIONS, output_dir,
+                                                      workers=args.workers, cache=cache,
+                                                      stream=args.stream, columnar=args.columnar,
+                                                      index=index, import_graph=args.import_graph,
+                                                      structure=args.structure)
+        elif args.no_dedup:
+            version_dirs = [d for d in os.listdir(repos_dir)
+                           if os.path.isdir(os.path.join(repos_dir, d))]
+            for version_dir in version_dirs:
+                if version_dir.startswith("flask_"):
+                    full_path = os.path.join(repos_dir, version_dir)
+                    summary = analyze_flask_version(full_path, output_dir,
+                                                    workers=args.workers, cache=cache,
+                                                    stream=args.stream, columnar=args.columnar,
+                                                    index=index, import_graph=args.import_graph,
+                                                    structure=args.structure)
+                    results[version_dir] = summary
+        else:
+            # 跨版本按内容去重，相同文件只解析一次
+            full_paths = [os.path.join(repos_dir, d) for d in os.listdir(repos_dir)
+                          if d.startswith("flask_") and os.path.isdir(os.path.join(repos_dir, d))]
+            results, dedup_stats = analyze_flask_versions(full_paths, output_dir,
+                                                          workers=args.workers, cache=cache,
+                                                          stream=args.stream, columnar=args.columnar,
+                                                          index=index, import_graph=args.import_graph,
+                                                          structure=args.structure)
         
         print(f" 完成了 {len(results)} 个版本的AST分析")
+        if index is not None:
+            index.close()
+            print(f" 符号索引: {os.path.join(output_dir, 'symbols.db')}")
+        
+        if args.import_graph:
+            from static_analysis.import_graph import diff_version_import_graphs
+            from static_analysis.version_diff import version_sort_key
+            # 按版本号排序，flask_2.10.0 在 flask_2.9.0 之后，相邻版本才能正确配对
+            diff_version_import_graphs(output_dir, sorted(results, key=version_sort_key))
+        
+        if args.call_graph:
+            from static_analysis.call_graph import build_version_call_graph
+            for version_name in sorted(results):
+                if args.from_git:
+                    tag = version_name[len("flask_"):]
+                    build_version_call_graph(version_name, output_dir,
+                                             sources=git_source.iter_sources(tag, ""))
+                else:
+                    build_version_call_graph(os.path.join(repos_dir, version_name), output_dir)
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(f" AST缓存: 命中 {cache_stats['hits']}，未命中 {cache_stats['misses']} "
+                  f"(命中率 {cache_stats['hit_rate']:.1%})")
+        
+        if args.benchmark and not args.from_git:
+            print("\n串行/并行AST分析耗时对比:")
+            timings = compare_serial_parallel(
+                [os.path.join(repos_dir, d) for d in sorted(results)],
+                workers=args.workers or os.cpu_count())
+            with open(os.path.join(output_dir, "ast_parallel_benchmark.json"), 'w', encoding='utf-8') as f:
+                json.dump(timings, f, indent=2, ensure_ascii=False)
     except Exception as e:
         print(f" AST分析失败: {e}")
     
     # 2. 使用LibCST分析（示例）
     print("\n[2/3] 使用LibCST分析代码模式...")
     try:
-        from static_analysis.libcst_modifier import analyze_with_libcst
+        from static_analysis.libcst_modifier import analyze_versions_with_libcst, iter_directory_files
         
-        # 只分析最新版本作为示例
-        latest_version = sorted([d for d in os.listdir(repos_dir) 
-                                if d.startswith("flask_")])[-1]
-        latest_path = os.path.join(repos_dir, latest_version)
-        libcst_output = os.path.join(output_dir, "libcst_analysis.json")
+        libcst_cache = None if args.no_cache else os.path.join(CACHE_DIR, "libcst")
         
-        patterns = analyze_with_libcst(latest_path, libcst_output)
-        print(f" LibCST分析完成: {patterns.get('total_files', 0)} 个文件")
+        # 分析全部版本，跨版本相同的文件只分析一次
+        if args.from_git:
+            version_sources = {f"flask_{tag}": git_source.iter_sources(tag, f"flask_{tag}")
+                               for tag in FLASK_VERSIONS}
+        else:
+            version_sources = {d: iter_directory_files(os.path.join(repos_dir, d))
+                               for d in sorted(os.listdir(repos_dir)) if d.startswith("flask_")}
+        summaries, libcst_timing = analyze_versions_with_libcst(version_sources, output_dir,
+                                                                workers=args.workers,
+                                                                cache_dir=libcst_cache,
+                                                                compare_serial=args.benchmark,
+                                                                metadata=args.libcst_metadata,
+                                                                prefilter=not args.no_prefilter,
+                                                                check_prefilter=args.check_prefilter)
+        print(f" LibCST分析完成: {len(summaries)} 个版本，{libcst_timing['total_files']} 个文件")
     except Exception as e:
         print(f" LibCST分析失败: {e}")
     
+    if args.from_git:
+        git_source.close()
+    
     # 3. 生成版本演化报告
     print("\n[3/3] 生成版本演化报告...")
     try:
@@ -89,6 +220,48 @@ def main():
     except Exception as e:
         print(f" 演化报告生成失败: {e}")
     
+    # 可选：逐提交演化序列
+    if args.commit_series:
+        print("\n[附加] 生成逐提交演化序列...")
+        if not os.path.exists(main_repo_path):
+            print(f" Flask仓库不存在: {main_repo_path}")
+        else:
+            try:
+                from static_analysis.ast_analyzer import ANALYZER_VERSION
+                from static_analysis.analysis_cache import AnalysisCache
+                from static_analysis.commit_series import build_commit_series
+                
+                series_cache = None
+                if not args.no_cache:
+                    series_cache = AnalysisCache(os.path.join(CACHE_DIR, "ast"), ANALYZER_VERSION)
+                series_stats = build_commit_series(main_repo_path, os.path.join(output_dir, "commit_series"),
+                                                   first_parent=args.first_parent, cache=series_cache)
+                print(f" 逐提交序列: {series_stats['output_file']}")
+            except Exception as e:
+                print(f" 逐提交序列生成失败: {e}")
+    
+    # 可选：函数级变更统计
+    if args.function_churn:
+        print("\n[附加] 统计函数级变更...")
+        if not os.path.exists(main_repo_path):
+            print(f" Flask仓库不存在: {main_repo_path}")
+        else:
+            try:
+                from static_analysis.ast_analyzer import ANALYZER_VERSION
+                from static_analysis.analysis_cache import AnalysisCache
+                from static_analysis.function_churn import build_function_churn
+                
+                churn_cache = None
+                if not args.no_cache:
+                    churn_cache = AnalysisCache(os.path.join(CACHE_DIR, "ast"), ANALYZER_VERSION)
+                churn_summary = build_function_churn(main_repo_path, os.path.join(output_dir, "function_churn"),
+                                                     cache=churn_cache)
+                for row in churn_summary["top_functions"][:5]:
+                    print(f"  {row['file']}::{row['function']}: {row['commits']} 次提交 "
+                          f"(+{row['lines_added']}/-{row['lines_deleted']}, {row['authors']} 位作者)")
+            except Exception as e:
+                print(f" 函数级变更统计失败: {e}")
+    
     print("\n" + "=" * 60)
     print("静态分析完成！")
     print("=" * 60)
@@ -1,7 +1,10 @@
 import os
-import subprocess
 import csv
-import pandas as pd
+import json
+import shutil
+import argparse
+import subprocess
+from datetime import datetime
 
 # === 配置路径 ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,64 +29,228 @@ def clone_flask_repo():
         print("请检查你的网络是否能访问 GitHub，或者是否安装了 Git。")
         exit(1)
 
-def extract_git_log():
-    """运行 git log 命令提取所有历史"""
-    print("[*] 正在提取提交记录...")
-    
-    # 定义 git log 的格式：哈希 | 作者 | 时间 | 信息
-    # %h = hash, %an = author name, %ad = date, %s = message
-    cmd = ['git', 'log', '--pretty=format:%h|%an|%ad|%s', '--date=iso']
-    
+# 提取的字段：(列名, git log 格式占位符)
+# %h = hash, %an = author name, %ad = date, %s = message
+LOG_FIELDS = (
+    ('commit_hash', '%h'),
+    ('author', '%an'),
+    ('date', '%ad'),
+    ('message', '%s'),
+)
+# 每攒够这么多条记录写出一次，内存占用与仓库的提交数无关
+CHUNK_SIZE = 10000
+# 增量提取的状态文件：与输出文件同名加后缀
+STATE_SUFFIX = '.state.json'
+
+def extract_git_log(repo_dir=REPO_DIR, revision=None, fields=LOG_FIELDS, date='iso'):
+    """流式运行 git log，逐条产出提交记录（元组，字段顺序同 fields）
+
+    字段之间和提交之间都用 NUL 分隔（-z），提交信息里的 | 或换行不会打乱解析；
+    输出通过管道分块读取，不在内存中保留完整日志。git 失败时抛出 CalledProcessError。
+    """
+    fmt = '%x00'.join(placeholder for _, placeholder in fields)
+    cmd = ['git', 'log', '-z', f'--format={fmt}', f'--date={date}']
+    if revision:
+        cmd.append(revision)
+
+    proc = subprocess.Popen(cmd, cwd=repo_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    record = []
+    pending = b''
+    received = False
     try:
-        # 在 REPO_DIR 目录下运行 git log
-        result = subprocess.run(cmd, cwd=REPO_DIR, capture_output=True, text=True, encoding='utf-8')
-        
-        if result.returncode != 0:
-            print("[-] Git 命令运行失败:", result.stderr)
-            return
-
-        # 获取输出的文本
-        logs = result.stdout.strip().split('\n')
-        print(f"[*] 提取成功！共获取到 {len(logs)} 条提交记录。")
-        
-        return logs
-    except Exception as e:
-        print(f"[-] 提取过程出错: {e}")
-        return []
-
-def save_to_csv(logs):
-    """将提取的文本保存为 CSV"""
-    print(f"[*] 正在写入 CSV 文件: {OUTPUT_CSV}")
-    
-    headers = ['commit_hash', 'author', 'date', 'message']
-    rows = []
-    
-    for line in logs:
-        try:
-            # 按 | 分割 (我们刚才在 git log 里定义的)
-            parts = line.split('|')
-            if len(parts) >= 4:
-                # 重新组合，防止 message 里也有 | 符号
-                commit_hash = parts[0]
-                author = parts[1]
-                date = parts[2]
-                message = "|".join(parts[3:]) 
-                rows.append([commit_hash, author, date, message])
-        except:
-            continue
-            
-    # 使用 pandas 保存，方便处理编码和格式
-    df = pd.DataFrame(rows, columns=headers)
-    df.to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig') # sig encoding 防止 Excel 打开乱码
-    print(f"[+] 完美！文件已保存。")
+        while True:
+            chunk = proc.stdout.read1(1 << 16)
+            if not chunk:
+                break
+            received = True
+            tokens = (pending + chunk).split(b'\0')
+            pending = tokens.pop()
+            for token in tokens:
+                record.append(token.decode('utf-8', errors='replace'))
+                if len(record) == len(fields):
+                    yield tuple(record)
+                    record = []
+        # 最后一个提交后面没有分隔符
+        if received:
+            record.append(pending.decode('utf-8', errors='replace'))
+            if len(record) == len(fields):
+                yield tuple(record)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr.decode('utf-8', errors='replace'))
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _write_csv(chunks, output_path, columns, existing=None):
+    count = 0
+    # sig encoding 防止 Excel 打开乱码
+    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            count += len(chunk)
+        if existing is not None:
+            # 旧记录原样按字节接在后面（跳过BOM和表头），不需要重新解析
+            f.flush()
+            with open(existing, 'rb') as old:
+                old.readline()
+                shutil.copyfileobj(old, f.buffer)
+    return count
+
+def _write_parquet(chunks, output_path, columns, existing=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("写出Parquet需要pyarrow，请运行: pip install pyarrow")
+
+    schema = pa.schema([(name, pa.string()) for name in columns])
+    count = 0
+    # 每个分块写成一个 row group
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for chunk in chunks:
+            arrays = [pa.array(values, type=pa.string()) for values in zip(*chunk)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(chunk)
+        if existing is not None:
+            for batch in pq.ParquetFile(existing).iter_batches(batch_size=CHUNK_SIZE):
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    return count
+
+def save_commits(rows, output_path=OUTPUT_CSV, fields=LOG_FIELDS, chunk_size=CHUNK_SIZE, existing=None):
+    """把提交记录按 chunk_size 分块写出，返回写出的条数（不含 existing 中的旧记录）
+
+    扩展名为 .parquet 时写 Parquet（需要 pyarrow），否则写 CSV。existing 为同格式的旧结果文件时，
+    其中的记录接在新记录之后（保持从新到旧的顺序）。
+    先写到临时文件，完成后再替换，中途失败不会留下写了一半的结果。
+    """
+    columns = [name for name, _ in fields]
+    output_path = os.path.abspath(output_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    write = _write_parquet if output_path.endswith('.parquet') else _write_csv
+    try:
+        count = write(_chunks(rows, chunk_size), tmp_path, columns, existing)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return count
+
+def _git(repo_dir, *args):
+    """运行 git 命令，成功时返回去掉首尾空白的输出，失败时返回 None"""
+    result = subprocess.run(['git', *args], cwd=repo_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+def load_state(output_path):
+    """读取输出文件对应的增量状态，不存在或损坏时返回 None"""
+    try:
+        with open(output_path + STATE_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_state(output_path, state):
+    tmp_path = output_path + STATE_SUFFIX + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, output_path + STATE_SUFFIX)
+
+def update_commits(repo_dir=REPO_DIR, output_path=OUTPUT_CSV, revision='HEAD', fields=LOG_FIELDS,
+                   date='iso', chunk_size=CHUNK_SIZE, full=False):
+    """增量更新提交历史，返回 (方式, 新写出的条数, 总条数)，方式为 full / incremental / unchanged
+
+    状态文件记录上次提取到的最新提交和当时的引用。再次运行时只提取 上次..现在 的提交，
+    写在已有记录前面；上次的提交已不是当前提交的祖先（历史被改写、强制推送）、
+    提取格式变化或输出文件缺失时，回退为完整重建。
+    增量追加的记录保持 git log 的顺序，但与旧记录之间不会按提交时间重新交错排序。
+    """
+    output_path = os.path.abspath(output_path)
+    head = _git(repo_dir, 'rev-parse', '--verify', f'{revision}^{{commit}}')
+    if head is None:
+        raise ValueError(f"无法解析版本: {revision}")
+    # 记录的是解析后的完整哈希，提取期间仓库再有新提交也不会影响这一次的结果
+    layout = {
+        'revision': revision,
+        'fields': [list(field) for field in fields],
+        'date': date,
+    }
+
+    state = None if full else load_state(output_path)
+    mode = 'full'
+    if state is None:
+        reason = "没有增量状态"
+    elif not os.path.exists(output_path):
+        reason = "输出文件不存在"
+    elif any(state.get(key) != value for key, value in layout.items()):
+        reason = "提取格式已变化"
+    elif state['head'] == head:
+        return 'unchanged', 0, state['rows']
+    elif _git(repo_dir, 'merge-base', '--is-ancestor', state['head'], head) is None:
+        # 上次的提交不存在或不再是祖先
+        reason = f"上次的提交 {state['head'][:12]} 已不在当前历史中"
+    else:
+        mode = 'incremental'
+        reason = None
+    if reason:
+        print(f"[*] 完整重建: {reason}")
+
+    if mode == 'incremental':
+        rows = extract_git_log(repo_dir, f"{state['head']}..{head}", fields, date)
+        count = save_commits(rows, output_path, fields, chunk_size, existing=output_path)
+        total = state['rows'] + count
+    else:
+        count = save_commits(extract_git_log(repo_dir, head, fields, date), output_path, fields, chunk_size)
+        total = count
+
+    _save_state(output_path, {
+        **layout,
+        'head': head,
+        'ref': _git(repo_dir, 'symbolic-ref', '-q', 'HEAD') if revision == 'HEAD' else revision,
+        'rows': total,
+        'updated_at': datetime.now().isoformat(),
+    })
+    return mode, count, total
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="提取 Flask 仓库的提交历史")
+    parser.add_argument('--output', default=OUTPUT_CSV,
+                        help="输出文件，扩展名为 .parquet 时写 Parquet（默认 commits_history.csv）")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"每次写出的记录数（默认 {CHUNK_SIZE}）")
+    parser.add_argument('--full', action='store_true',
+                        help="忽略增量状态，重新提取全部历史")
+    args = parser.parse_args()
+
     # 1. 准备仓库
     clone_flask_repo()
-    
-    # 2. 提取日志
-    logs = extract_git_log()
-    
-    # 3. 保存结果
-    if logs:
-        save_to_csv(logs)
\ No newline at end of file
+
+    # 2. 提取新增的提交并保存
+    print("[*] 正在提取提交记录...")
+    print(f"[*] 正在写入文件: {args.output}")
+    try:
+        mode, count, total = update_commits(output_path=args.output, chunk_size=args.chunk_size, full=args.full)
+        if mode == 'unchanged':
+            print(f"[*] 没有新的提交，共 {total} 条提交记录。")
+        else:
+            print(f"[+] 完美！新写入 {count} 条提交记录，共 {total} 条。")
+    except subprocess.CalledProcessError as e:
+        print("[-] Git 命令运行失败:", e.stderr)
+    except Exception as e:
+        print(f"[-] 提取过程出错: {e}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+分析结果缓存 - 按文件内容哈希缓存单文件分析结果
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+class AnalysisCache:
+    """持久化的磁盘缓存，键为 文件内容哈希 + 分析器版本，按总大小做LRU淘汰"""
+
+    INDEX_FILE = "index.json"
+    ENTRY_SUFFIX = ".json"
+
+    def __init__(self, cache_dir, version, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 键 -> 条目大小，按访问顺序排列（最久未使用的在前）
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._dirty = False
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+        self._evict()
+
+    def _load_index(self):
+        """读取LRU索引"""
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            for key, size in index.get("entries", []):
+                self.entries[key] = size
+                self.total_bytes += size
+        except Exception as e:
+            print(f"读取缓存索引失败 {index_path}: {e}")
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.ENTRY_SUFFIX}")
+
+    def _dumps(self, value):
+        """条目序列化为bytes，子类可改用其他格式"""
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _loads(self, data):
+        return json.loads(data)
+
+    def key(self, content):
+        """根据文件内容（bytes）和分析器版本计算缓存键"""
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key, require=None):
+        """读取缓存条目，未命中返回None；给出require时缺少该键的条目也视为未命中"""
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                value = self._loads(f.read())
+        except Exception:
+            # 条目文件丢失或损坏，视为未命中
+            self._remove(key)
+            self.misses += 1
+            return None
+        if require is not None and require not in value:
+            # 条目由其他模式写入，重新分析后会被覆盖
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self._dirty = True
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """写入缓存条目（value为bytes时视为已序列化），超出容量时淘汰最久未使用的条目"""
+        data = value if isinstance(value, bytes) else self._dumps(value)
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        self.entries[key] = len(data)
+        self.total_bytes += len(data)
+        self._dirty = True
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限"""
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+
+    def _remove(self, key):
+        size = self.entries.pop(key, 0)
+        self.total_bytes -= size
+        self._dirty = True
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def save(self):
+        """将LRU索引写回磁盘"""
+        if not self._dirty:
+            return
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": [[k, v] for k, v in self.entries.items()]}, f)
+        os.replace(tmp_path, index_path)
+        self._dirty = False
+
+    def stats(self):
+        """返回命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes
+        }
@@ -7,10 +7,281 @@ AST静态分析器 - 分析Flask代码结构
 import ast
 import os
 import json
+import time
+import shutil
+import hashlib
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# 分析器版本：单文件记录的结构变化时需递增，使旧缓存失效
+ANALYZER_VERSION = "7"
+# 结构哈希模式下单文件结果中附加的键（见structural_hash），缓存条目缺少该键时需重新解析
+STRUCTURE_KEY = "structure"
+
+def list_python_files(directory):
+    """按os.walk顺序列出目录下所有.py文件"""
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.py'):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+def _chunksize(total, workers):
+    """为进程池计算批大小，减少进程间通信次数"""
+    return max(1, total // (workers * 4))
+
+def _collect_file_worker(file_path, structure=False):
+    """进程池工作函数：解析单个文件并返回结果"""
+    return FlaskASTAnalyzer(structure=structure)._collect_file(file_path)
+
+def _collect_source_worker(source, structure=False):
+    """进程池工作函数：解析内存中的源码 (文件路径, 内容bytes)"""
+    file_path, raw = source
+    return FlaskASTAnalyzer(structure=structure)._collect_file(file_path, raw)
+
+def _strip_file(result):
+    """去掉结果中的文件路径，便于不同路径下的相同内容共享缓存"""
+    stripped = {"file_stats": {k: v for k, v in result["file_stats"].items() if k != "file"}}
+    for key in ("function_details", "class_details", "import_details"):
+        stripped[key] = [{k: v for k, v in record.items() if k != "file"}
+                         for record in result[key]]
+    if STRUCTURE_KEY in result:
+        stripped[STRUCTURE_KEY] = result[STRUCTURE_KEY]
+    return stripped
+
+def _restamp_file(cached, file_path):
+    """为缓存结果重新填入当前文件路径（保持 file 为首个键）"""
+    result = {"file_stats": {"file": os.path.relpath(file_path), **cached["file_stats"]}}
+    for key in ("function_details", "class_details", "import_details"):
+        result[key] = [{"file": file_path, **record} for record in cached[key]]
+    if STRUCTURE_KEY in cached:
+        result[STRUCTURE_KEY] = cached[STRUCTURE_KEY]
+    return result
+
+# 可能包含语句列表的字段；函数、类和导入只会出现在语句列表中
+_STMT_LIST_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+_stmt_fields_by_type = {}
+
+def _stmt_fields(node_type):
+    """返回某节点类型上存在的语句列表字段（按类型缓存）"""
+    fields = _stmt_fields_by_type.get(node_type)
+    if fields is None:
+        fields = tuple(f for f in _STMT_LIST_FIELDS if f in node_type._fields)
+        _stmt_fields_by_type[node_type] = fields
+    return fields
+
+# 增加嵌套层级的控制流语句
+_NESTING_STMTS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try, ast.Match)
+if hasattr(ast, "TryStar"):
+    _NESTING_STMTS += (ast.TryStar,)
+_LOOP_STMTS = (ast.For, ast.AsyncFor, ast.While)
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+def _function_metrics(func_node):
+    """计算函数的圈复杂度、认知复杂度、最大嵌套深度和分支数
+    
+    只遍历本函数自身的代码，嵌套的函数和类由各自的记录统计。
+    认知复杂度为简化版：控制结构按嵌套层级加权，elif/else 和布尔运算序列各加1。
+    """
+    complexity = 1
+    cognitive = 0
+    branches = 0
+    max_nesting = 0
+    # (节点, 嵌套深度, 是否为elif)
+    stack = [(child, 0, False) for child in func_node.body]
+    push = stack.append
+    while stack:
+        node, depth, is_elif = stack.pop()
+        node_type = type(node)
+        if node_type in _SCOPE_NODES:
+            continue
+        
+        if node_type is ast.If:
+            complexity += 1
+            branches += 1
+            cognitive += 1 if is_elif else 1 + depth
+            inner = depth + 1
+            max_nesting = max(max_nesting, inner)
+            push((node.test, depth, False))
+            for child in node.body:
+                push((child, inner, False))
+            if len(node.orelse) == 1 and type(node.orelse[0]) is ast.If:
+                push((node.orelse[0], depth, True))
+            elif node.orelse:
+                cognitive += 1
+                for child in node.orelse:
+                    push((child, inner, False))
+            continue
+        
+        if isinstance(node, _NESTING_STMTS):
+            inner = depth + 1
+            max_nesting = max(max_nesting, inner)
+            if node_type in _LOOP_STMTS:
+                complexity += 1
+                cognitive += 1 + depth
+                if node.orelse:
+                    cognitive += 1
+            elif node_type is ast.Match:
+                cognitive += 1 + depth
+            for field, value in ast.iter_fields(node):
+                if isinstance(value, list):
+                    for child in value:
+                        if isinstance(child, ast.stmt):
+                            push((child, inner, False))
+                        else:
+                            # except子句、match分支、with项等
+                            push((child, depth if field != "cases" else inner, False))
+                elif isinstance(value, ast.AST):
+                    push((value, depth, False))
+            continue
+        
+        if node_type is ast.ExceptHandler:
+            complexity += 1
+            cognitive += 1 + depth
+        elif node_type is ast.match_case:
+            complexity += 1
+            branches += 1
+        elif node_type is ast.IfExp:
+            complexity += 1
+            branches += 1
+            cognitive += 1 + depth
+        elif node_type is ast.BoolOp:
+            complexity += len(node.values) - 1
+            cognitive += 1
+        elif node_type is ast.comprehension:
+            complexity += 1 + len(node.ifs)
+            cognitive += 1
+        elif node_type is ast.Lambda:
+            depth += 1
+        
+        for child in ast.iter_child_nodes(node):
+            push((child, depth, False))
+    
+    return {
+        "complexity": complexity,
+        "cognitive": cognitive,
+        "max_nesting": max_nesting,
+        "branches": branches,
+    }
+
+class _StructureCollector:
+    """单次遍历收集函数（含async）、类、方法和导入，并记录嵌套上下文
+    
+    通过节点类型查表分派，只沿语句列表下降，不进入表达式子树。
+    """
+    
+    def __init__(self, analyzer, file_path, result):
+        self.analyzer = analyzer
+        self.file_path = file_path
+        self.result = result
+        # 结构哈希模式下按记录顺序保存函数和类的哈希及函数的MinHash签名，不写入记录本身
+        self.hasher = None
+        if analyzer.structure:
+            from static_analysis.structural_hash import StructuralHasher
+            from static_analysis.similarity import function_signature
+            self.hasher = StructuralHasher()
+            self.function_signature = function_signature
+            self.function_hashes = []
+            self.function_signatures = []
+            self.class_hashes = []
+        # 外层作用域栈：(名称, 所属类的方法列表或None)
+        self.scope = []
+        self._dispatch = {
+            ast.FunctionDef: self._visit_function,
+            ast.AsyncFunctionDef: self._visit_function,
+            ast.ClassDef: self._visit_class,
+            ast.Import: self._visit_import,
+            ast.ImportFrom: self._visit_import,
+        }
+    
+    def visit(self, node):
+        handler = self._dispatch.get(type(node))
+        if handler is None:
+            self._visit_body(node)
+        else:
+            handler(node)
+    
+    def _visit_body(self, node):
+        dispatch = self._dispatch
+        for field in _stmt_fields(type(node)):
+            for child in getattr(node, field):
+                handler = dispatch.get(type(child))
+                if handler is None:
+                    self._visit_body(child)
+                else:
+                    handler(child)
+    
+    def _scope_name(self):
+        return ".".join(name for name, _ in self.scope)
+    
+    def _visit_function(self, node):
+        class_methods = self.scope[-1][1] if self.scope else None
+        is_method = class_methods is not None
+        if is_method:
+            class_methods.append(node.name)
+        
+        func_info = self.analyzer._analyze_function(node, self.file_path,
+                                                    self._scope_name(), is_method)
+        func_info.update(_function_metrics(node))
+        self.result["function_details"].append(func_info)
+        if self.hasher is not None:
+            slot = len(self.function_hashes)
+            self.function_hashes.append(None)
+            self.function_signatures.append(self.function_signature(node))
+        
+        self.scope.append((node.name, None))
+        self._visit_body(node)
+        self.scope.pop()
+        if self.hasher is not None:
+            # 嵌套定义已先行计算，外层哈希直接复用其结果
+            self.function_hashes[slot] = self.hasher.hash(node)
+    
+    def _visit_class(self, node):
+        class_info = self.analyzer._analyze_class(node, self.file_path, self._scope_name())
+        self.result["class_details"].append(class_info)
+        if self.hasher is not None:
+            slot = len(self.class_hashes)
+            self.class_hashes.append(None)
+        
+        methods = []
+        self.scope.append((node.name, methods))
+        self._visit_body(node)
+        self.scope.pop()
+        
+        class_info["methods"] = len(methods)
+        class_info["method_names"] = methods[:5]
+        if self.hasher is not None:
+            self.class_hashes[slot] = self.hasher.hash(node)
+    
+    def structure(self, tree):
+        """文件的结构哈希条目：文件哈希，限定名 -> 哈希 的函数和类，
+        以及用于识别移动或改名函数的MinHash签名（见StructureHashWriter、similarity）"""
+        from static_analysis.structural_hash import qualified_names
+        function_names = qualified_names(self.result["function_details"])
+        return {
+            "hash": self.hasher.hash(tree),
+            "functions": dict(zip(function_names, self.function_hashes)),
+            "classes": dict(zip(qualified_names(self.result["class_details"]), self.class_hashes)),
+            "signatures": {name: signature for name, signature
+                           in zip(function_names, self.function_signatures) if signature is not None},
+        }
+    
+    def _visit_import(self, node):
+        import_info = self.analyzer._analyze_import(node, self.file_path)
+        self.result["import_details"].append(import_info)
 
 class FlaskASTAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None, sink=None, listeners=None, structure=False):
+        # 可选的AnalysisCache，命中时跳过ast.parse
+        self.cache = cache
+        # 为True时附带计算结构哈希（结果中的 structure 键），供版本间的结构对比使用
+        self.structure = structure
+        # 可选的流式写入器（如JsonlResultWriter）；设置后明细记录直接写出，不在内存中保留
+        self.sink = sink
+        # 额外接收每个文件结果的写入器（如SymbolIndexWriter），不影响正常输出
+        self.listeners = list(listeners or [])
         self.stats = {
             "files_analyzed": 0,
             "total_functions": 0,
@@ -20,12 +291,63 @@ class FlaskASTAnalyzer:
             "class_details": [],
             "import_details": []
         }
+        # 名称计数在合并时即时更新，供save_results生成摘要
+        self.function_counts = defaultdict(int)
+        self.class_counts = defaultdict(int)
+        self.import_counts = defaultdict(int)
     
     def analyze_file(self, file_path):
         """分析单个Python文件的AST结构"""
+        result = self._collect_file_cached(file_path)
+        if result is None:
+            return None
+        self._merge_file_result(result)
+        return result["file_stats"]
+    
+    def _read_source(self, file_path):
+        """读取文件内容，返回(bytes, 缓存键)"""
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        key = self.cache.key(raw) if self.cache is not None else None
+        return raw, key
+    
+    def _lookup_cache(self, file_path):
+        """查询缓存，返回(结果或None, 文件内容, 缓存键)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            raw, key = self._read_source(file_path)
+        except Exception as e:
+            print(f"解析文件失败 {file_path}: {e}")
+            return None, None, None
+        cached = self._cache_get(key)
+        if cached is not None:
+            return _restamp_file(cached, file_path), raw, key
+        return None, raw, key
+    
+    def _cache_get(self, key):
+        """结构哈希模式下缺少结构哈希的缓存条目视为未命中"""
+        return self.cache.get(key, require=STRUCTURE_KEY if self.structure else None)
+    
+    def _store_cache(self, key, result):
+        if key is not None and result is not None:
+            self.cache.put(key, _strip_file(result))
+    
+    def _collect_file_cached(self, file_path):
+        """带缓存的单文件解析"""
+        if self.cache is None:
+            return self._collect_file(file_path)
+        result, raw, key = self._lookup_cache(file_path)
+        if result is None and key is not None:
+            result = self._collect_file(file_path, raw)
+            self._store_cache(key, result)
+        return result
+    
+    def _collect_file(self, file_path, raw=None):
+        """解析单个文件，返回该文件的统计和明细记录（不修改self.stats）"""
+        try:
+            if raw is None:
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+            content = raw.decode('utf-8')
             
             tree = ast.parse(content)
             file_stats = {
@@ -35,40 +357,57 @@ class FlaskASTAnalyzer:
                 "imports": 0,
                 "lines": len(content.splitlines())
             }
+            result = {
+                "file_stats": file_stats,
+                "function_details": [],
+                "class_details": [],
+                "import_details": []
+            }
             
-            for node in ast.walk(tree):
-                # 统计函数
-                if isinstance(node, ast.FunctionDef):
-                    file_stats["functions"] += 1
-                    func_info = self._analyze_function(node, file_path)
-                    self.stats["function_details"].append(func_info)
-                
-                # 统计类
-                elif isinstance(node, ast.ClassDef):
-                    file_stats["classes"] += 1
-                    class_info = self._analyze_class(node, file_path)
-                    self.stats["class_details"].append(class_info)
-                
-                # 统计导入
-                elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                    file_stats["imports"] += 1
-                    import_info = self._analyze_import(node, file_path)
-                    self.stats["import_details"].append(import_info)
-            
-            # 更新总体统计
-            self.stats["files_analyzed"] += 1
-            self.stats["total_functions"] += file_stats["functions"]
-            self.stats["total_classes"] += file_stats["classes"]
-            self.stats["total_imports"] += file_stats["imports"]
+            collector = _StructureCollector(self, file_path, result)
+            collector.visit(tree)
+            if self.structure:
+                result[STRUCTURE_KEY] = collector.structure(tree)
+            file_stats["functions"] = len(result["function_details"])
+            file_stats["classes"] = len(result["class_details"])
+            file_stats["imports"] = len(result["import_details"])
             
-            return file_stats
+            return result
             
         except Exception as e:
             print(f"解析文件失败 {file_path}: {e}")
             return None
     
-    def _analyze_function(self, node, file_path):
-        """分析函数节点"""
+    def _merge_file_result(self, result):
+        """将单个文件的分析结果合并到总体统计"""
+        file_stats = result["file_stats"]
+        for listener in self.listeners:
+            listener.write_file_result(result)
+        if self.sink is not None:
+            self.sink.write_file_result(result)
+        else:
+            self.stats["function_details"].extend(result["function_details"])
+            self.stats["class_details"].extend(result["class_details"])
+            self.stats["import_details"].extend(result["import_details"])
+        
+        for func in result["function_details"]:
+            self.function_counts[func["name"]] += 1
+        for cls in result["class_details"]:
+            self.class_counts[cls["name"]] += 1
+        for imp in result["import_details"]:
+            for item in imp["imports"]:
+                module = item.get("module") or item.get("name", "")
+                if module:
+                    self.import_counts[module] += 1
+        
+        # 更新总体统计
+        self.stats["files_analyzed"] += 1
+        self.stats["total_functions"] += file_stats["functions"]
+        self.stats["total_classes"] += file_stats["classes"]
+        self.stats["total_imports"] += file_stats["imports"]
+    
+    def _analyze_function(self, node, file_path, scope="", is_method=False):
+        """分析函数节点（含async函数），scope为外层类/函数的限定名"""
         # 计算函数长度
         func_lines = node.end_lineno - node.lineno + 1 if node.end_lineno else 0
         
@@ -109,17 +448,13 @@ class FlaskASTAnalyzer:
             "args": args_count,
             "lines": func_lines,
             "decorators": decorators,
-            "is_async": isinstance(node, ast.AsyncFunctionDef)
+            "is_async": isinstance(node, ast.AsyncFunctionDef),
+            "scope": scope,
+            "is_method": is_method
         }
     
-    def _analyze_class(self, node, file_path):
-        """分析类节点"""
-        # 查找类中的方法
-        methods = []
-        for item in node.body:
-            if isinstance(item, ast.FunctionDef):
-                methods.append(item.name)
-        
+    def _analyze_class(self, node, file_path, scope=""):
+        """分析类节点，方法信息由遍历过程回填"""
         # 查找基类
         bases = []
         for base in node.bases:
@@ -130,9 +465,10 @@ class FlaskASTAnalyzer:
             "file": file_path,
             "name": node.name,
             "line": node.lineno,
-            "methods": len(methods),
+            "methods": 0,
             "bases": bases,
-            "method_names": methods[:5]  # 只取前5个方法名
+            "method_names": [],  # 只取前5个方法名
+            "scope": scope
         }
     
     def _analyze_import(self, node, file_path):
@@ -161,17 +497,86 @@ class FlaskASTAnalyzer:
             "imports": imports
         }
     
-    def analyze_directory(self, directory):
-        """分析整个目录的Python文件"""
+    def analyze_sources(self, sources):
+        """分析内存中的源码，sources为 (文件路径, 内容bytes) 的可迭代对象"""
+        for file_path, raw in sources:
+            if self.cache is not None:
+                key = self.cache.key(raw)
+                cached = self._cache_get(key)
+                if cached is not None:
+                    self._merge_file_result(_restamp_file(cached, file_path))
+                    continue
+            result = self._collect_file(file_path, raw)
+            if result is None:
+                continue
+            if self.cache is not None:
+                self._store_cache(key, result)
+            self._merge_file_result(result)
+        if self.cache is not None:
+            self.cache.save()
+        return self.summary()
+    
+    def analyze_directory(self, directory, workers=None):
+        """分析整个目录的Python文件
+        
+        workers大于1时使用进程池并行解析文件，结果按文件遍历顺序合并，
+        与串行结果完全一致。
+        """
         print(f"分析目录: {directory}")
         
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.py'):
-                    file_path = os.path.join(root, file)
-                    self.analyze_file(file_path)
+        file_paths = list_python_files(directory)
+        cache_before = (self.cache.hits, self.cache.misses) if self.cache is not None else None
+        
+        if workers and workers > 1:
+            # 先在主进程查缓存，只把未命中的文件交给进程池
+            cached = {}
+            pending, keys = [], []
+            skipped = set()
+            for i, file_path in enumerate(file_paths):
+                if self.cache is None:
+                    pending.append(i)
+                    continue
+                result, raw, key = self._lookup_cache(file_path)
+                if result is not None:
+                    cached[i] = result
+                elif key is not None:
+                    pending.append(i)
+                    keys.append(key)
+                else:
+                    skipped.add(i)
+            
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map按提交顺序返回结果，按文件顺序边到达边合并
+                parsed = executor.map(_collect_file_worker,
+                                      [file_paths[i] for i in pending], repeat(self.structure),
+                                      chunksize=_chunksize(len(pending), workers))
+                n = 0
+                for i in range(len(file_paths)):
+                    if i in skipped:
+                        continue
+                    if i in cached:
+                        result = cached.pop(i)
+                    else:
+                        result = next(parsed)
+                        if self.cache is not None:
+                            self._store_cache(keys[n], result)
+                        n += 1
+                    if result is not None:
+                        self._merge_file_result(result)
+        else:
+            for file_path in file_paths:
+                self.analyze_file(file_path)
+        
+        if self.cache is not None:
+            self.cache.save()
+            hits = self.cache.hits - cache_before[0]
+            misses = self.cache.misses - cache_before[1]
+            print(f"缓存命中: {hits}，未命中: {misses}")
         
-        # 生成摘要统计
+        return self.summary()
+    
+    def summary(self):
+        """生成摘要统计"""
         summary = {
             "total_files": self.stats["files_analyzed"],
             "total_functions": self.stats["total_functions"],
@@ -187,29 +592,24 @@ class FlaskASTAnalyzer:
         """保存分析结果"""
         os.makedirs(output_dir, exist_ok=True)
         
-        # 保存详细结果
-        with open(os.path.join(output_dir, "ast_analysis_detailed.json"), 'w', encoding='utf-8') as f:
-            json.dump(self.stats, f, indent=2, ensure_ascii=False)
+        for listener in self.listeners:
+            listener.close()
         
-        # 保存函数统计
-        function_stats = defaultdict(int)
-        for func in self.stats["function_details"]:
-            function_stats[func["name"]] += 1
+        # 保存详细结果（流式模式下明细已写入JSONL，这里只需关闭写入器）
+        if self.sink is not None:
+            self.sink.close()
+        else:
+            with open(os.path.join(output_dir, "ast_analysis_detailed.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, indent=2, ensure_ascii=False)
         
-        # 保存类统计
-        class_stats = defaultdict(int)
-        for cls in self.stats["class_details"]:
-            class_stats[cls["name"]] += 1
-        
-        # 保存导入统计
-        import_stats = defaultdict(int)
-        for imp in self.stats["import_details"]:
-            for item in imp["imports"]:
-                module = item.get("module") or item.get("name", "")
-                if module:
-                    import_stats[module] += 1
+        # 函数、类、导入统计已在合并时累计
+        function_stats = self.function_counts
+        class_stats = self.class_counts
+        import_stats = self.import_counts
         
+        # 汇总数与名称计数一起写入摘要，版本演化分析只需读取这个小文件
         summary = {
+            **self.summary(),
             "function_counts": dict(sorted(function_stats.items(), key=lambda x: x[1], reverse=True)[:20]),
             "class_counts": dict(sorted(class_stats.items(), key=lambda x: x[1], reverse=True)[:20]),
             "import_counts": dict(sorted(import_stats.items(), key=lambda x: x[1], reverse=True)[:20]),
@@ -221,28 +621,286 @@ class FlaskASTAnalyzer:
         print(f"AST分析结果已保存到: {output_dir}")
         return summary
 
-def analyze_flask_version(version_dir, output_dir):
-    """分析特定版本的Flask"""
-    print(f"\n{'='*60}")
-    print(f"分析Flask版本: {os.path.basename(version_dir)}")
-    print('='*60)
-    
-    analyzer = FlaskASTAnalyzer()
-    summary = analyzer.analyze_directory(version_dir)
-    
+# 各输出模式的明细结果：默认JSON、流式JSONL（stream）、列式Parquet目录（columnar）
+DETAILED_OUTPUTS = ("ast_analysis_detailed.json", "ast_analysis_detailed.jsonl", "ast_columnar")
+
+def _detailed_output(stream=False, columnar=False):
+    if columnar:
+        return DETAILED_OUTPUTS[2]
+    if stream:
+        return DETAILED_OUTPUTS[1]
+    return DETAILED_OUTPUTS[0]
+
+def _make_sink(version_output_dir, stream=False, columnar=False):
+    """根据输出模式创建流式写入器，默认返回None（整体写出JSON）"""
+    output = os.path.join(version_output_dir, _detailed_output(stream, columnar))
+    if columnar:
+        from static_analysis.columnar_store import ParquetResultWriter
+        return ParquetResultWriter(output)
+    if stream:
+        from static_analysis.result_stream import JsonlResultWriter
+        return JsonlResultWriter(output)
+    return None
+
+def _remove_stale_outputs(version_output_dir, stream=False, columnar=False):
+    """删除其他输出模式之前留下的明细结果
+
+    读取方按固定优先级（列式 > JSONL > JSON）选用明细，旧模式的结果留在目录中会被误用。
+    """
+    current = _detailed_output(stream, columnar)
+    for name in DETAILED_OUTPUTS:
+        path = os.path.join(version_output_dir, name)
+        if name == current:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def _print_summary(summary):
     print(f"文件数量: {summary['total_files']}")
     print(f"函数总数: {summary['total_functions']}")
     print(f"类总数: {summary['total_classes']}")
     print(f"导入总数: {summary['total_imports']}")
     print(f"平均每文件函数数: {summary['avg_functions_per_file']:.2f}")
     print(f"平均每文件类数: {summary['avg_classes_per_file']:.2f}")
+
+def _version_listeners(version_name, version_output_dir, index=None, import_graph=False,
+                       structure=False):
+    """每个版本额外的结果监听器：符号索引写入器、模块依赖图、结构哈希"""
+    from static_analysis.structural_hash import StructureHashWriter, STRUCTURE_FILE
+    structure_file = os.path.join(version_output_dir, STRUCTURE_FILE)
+    listeners = []
+    if structure:
+        listeners.append(StructureHashWriter(version_name, structure_file))
+    elif os.path.exists(structure_file):
+        # 未计算结构哈希时删除旧的结果，避免版本对比使用过期的结构
+        os.remove(structure_file)
+    if index is not None:
+        listeners.append(index.writer(version_name))
+    if import_graph:
+        from static_analysis.import_graph import ImportGraphWriter, IMPORT_GRAPH_FILE
+        listeners.append(ImportGraphWriter(version_name,
+                                           os.path.join(version_output_dir, IMPORT_GRAPH_FILE)))
+    return listeners
+
+def analyze_flask_version(version_dir, output_dir, workers=None, cache=None, stream=False,
+                          columnar=False, index=None, import_graph=False, structure=False):
+    """分析特定版本的Flask
+    
+    stream为True时明细记录边分析边写入 ast_analysis_detailed.jsonl，
+    columnar为True时写入 ast_columnar/ 下的Parquet表，
+    两种模式都不再生成完整的 ast_analysis_detailed.json。
+    index为SymbolIndex时同时把结果写入符号索引。
+    import_graph为True时同时构建模块依赖图（import_graph.json）。
+    structure为True时同时计算结构哈希（structure_hashes.json），供版本间的结构对比和移动检测使用。
+    """
+    print(f"\n{'='*60}")
+    print(f"分析Flask版本: {os.path.basename(version_dir)}")
+    print('='*60)
+    
+    version_name = os.path.basename(version_dir)
+    version_output_dir = os.path.join(output_dir, version_name)
+    analyzer = FlaskASTAnalyzer(cache=cache, sink=_make_sink(version_output_dir, stream, columnar),
+                                listeners=_version_listeners(version_name, version_output_dir,
+                                                             index, import_graph, structure),
+                                structure=structure)
+    summary = analyzer.analyze_directory(version_dir, workers=workers)
+    _print_summary(summary)
     
     # 保存结果
-    version_output_dir = os.path.join(output_dir, os.path.basename(version_dir))
     analyzer.save_results(version_output_dir)
+    _remove_stale_outputs(version_output_dir, stream, columnar)
     
     return summary
 
+def _analyze_blobs(blobs, workers=None, cache=None, structure=False):
+    """分析去重后的文件内容
+    
+    blobs: 内容标识 -> (文件路径, 内容bytes)；返回 内容标识 -> 不含路径的结果（失败为None）
+    """
+    analyzer = FlaskASTAnalyzer(cache=cache, structure=structure)
+    blob_results = {}
+    pending = []
+    for digest, (file_path, raw) in blobs.items():
+        key = None
+        if cache is not None:
+            key = cache.key(raw)
+            cached = analyzer._cache_get(key)
+            if cached is not None:
+                blob_results[digest] = cached
+                continue
+        if workers and workers > 1:
+            pending.append(digest)
+            continue
+        result = analyzer._collect_file(file_path, raw)
+        blob_results[digest] = _strip_file(result) if result is not None else None
+        if key is not None and result is not None:
+            cache.put(key, blob_results[digest])
+    
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # 内容直接传给子进程，兼容不落盘的git blob
+            parsed = executor.map(_collect_source_worker,
+                                  [blobs[digest] for digest in pending], repeat(structure),
+                                  chunksize=_chunksize(len(pending), workers))
+            for digest, result in zip(pending, parsed):
+                blob_results[digest] = _strip_file(result) if result is not None else None
+                if cache is not None and result is not None:
+                    cache.put(cache.key(blobs[digest][1]), blob_results[digest])
+    if cache is not None:
+        cache.save()
+    return blob_results
+
+def _fan_out_versions(version_files, blob_results, output_dir, stream=False, columnar=False,
+                      index=None, import_graph=False, structure=False):
+    """按各版本的文件顺序分发去重结果并保存，返回各版本摘要"""
+    results = {}
+    for version_name, entries in version_files.items():
+        print(f"\n{'='*60}")
+        print(f"分析Flask版本: {version_name}")
+        print('='*60)
+        
+        version_output_dir = os.path.join(output_dir, version_name)
+        version_analyzer = FlaskASTAnalyzer(sink=_make_sink(version_output_dir, stream, columnar),
+                                            listeners=_version_listeners(version_name, version_output_dir,
+                                                                         index, import_graph, structure))
+        for file_path, digest in entries:
+            cached = blob_results.get(digest)
+            if cached is not None:
+                version_analyzer._merge_file_result(_restamp_file(cached, file_path))
+        
+        summary = version_analyzer.summary()
+        _print_summary(summary)
+        version_analyzer.save_results(version_output_dir)
+        _remove_stale_outputs(version_output_dir, stream, columnar)
+        results[version_name] = summary
+    return results
+
+def _dedup_stats(total_files, unique_files, index_time, analyze_time):
+    # 按唯一文件的平均分析耗时估算重复文件节省的时间
+    per_blob = analyze_time / unique_files if unique_files else 0
+    dedup_stats = {
+        "total_files": total_files,
+        "unique_files": unique_files,
+        "dedup_ratio": round(1 - unique_files / total_files, 4) if total_files else 0,
+        "hash_seconds": round(index_time, 4),
+        "analyze_seconds": round(analyze_time, 4),
+        "estimated_seconds_saved": round(per_blob * (total_files - unique_files), 4),
+    }
+    print(f"\n跨版本去重: {total_files} 个文件中有 {unique_files} 个唯一内容 "
+          f"(去重率 {dedup_stats['dedup_ratio']:.1%})，"
+          f"预计节省分析时间 {dedup_stats['estimated_seconds_saved']:.3f}s")
+    return dedup_stats
+
+def analyze_flask_versions(version_dirs, output_dir, workers=None, cache=None, stream=False,
+                           columnar=False, index=None, import_graph=False, structure=False):
+    """分析多个Flask版本，跨版本内容相同的文件只解析一次
+    
+    先对所有版本的文件按内容哈希去重，每个唯一文件只分析一次，
+    再按各版本的文件顺序把结果分发回去，各版本输出与逐个调用
+    analyze_flask_version 完全一致。返回 (各版本摘要, 去重统计)。
+    """
+    start = time.perf_counter()
+    
+    # 1. 按内容哈希索引所有版本的文件
+    version_files = {}
+    blobs = {}  # 内容哈希 -> (首个文件路径, 文件内容)
+    total_files = 0
+    for version_dir in version_dirs:
+        entries = []
+        for file_path in list_python_files(version_dir):
+            try:
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+            except Exception as e:
+                print(f"解析文件失败 {file_path}: {e}")
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            entries.append((file_path, digest))
+            if digest not in blobs:
+                blobs[digest] = (file_path, raw)
+        version_files[os.path.basename(version_dir)] = entries
+        total_files += len(entries)
+    index_time = time.perf_counter() - start
+    
+    # 2. 每个唯一文件只分析一次，结果不含路径
+    start = time.perf_counter()
+    blob_results = _analyze_blobs(blobs, workers, cache, structure)
+    analyze_time = time.perf_counter() - start
+    blobs.clear()
+    
+    # 3. 按版本分发结果并保存
+    results = _fan_out_versions(version_files, blob_results, output_dir, stream, columnar, index,
+                                import_graph, structure)
+    return results, _dedup_stats(total_files, len(blob_results), index_time, analyze_time)
+
+def analyze_flask_tags(source, tags, output_dir, workers=None, cache=None, stream=False,
+                       columnar=False, index=None, import_graph=False, structure=False):
+    """直接从git对象分析多个标签，无需检出和复制源码
+    
+    source为提供 list_files(rev) 和 read_blob(sha) 的对象（如GitBlobSource）。
+    git的blob哈希本身就是内容标识，跨标签相同的文件只读取和解析一次。
+    输出目录与磁盘模式一致，为 output_dir/flask_<tag>。
+    """
+    start = time.perf_counter()
+    
+    version_files = {}
+    blobs = {}  # blob哈希 -> (虚拟路径, 文件内容)
+    total_files = 0
+    for tag in tags:
+        version_name = f"flask_{tag}"
+        entries = []
+        for path, sha in source.list_files(tag):
+            file_path = os.path.join(version_name, path)
+            entries.append((file_path, sha))
+            if sha not in blobs:
+                blobs[sha] = (file_path, source.read_blob(sha))
+        version_files[version_name] = entries
+        total_files += len(entries)
+    index_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    blob_results = _analyze_blobs(blobs, workers, cache, structure)
+    analyze_time = time.perf_counter() - start
+    blobs.clear()
+    
+    results = _fan_out_versions(version_files, blob_results, output_dir, stream, columnar, index,
+                                import_graph, structure)
+    return results, _dedup_stats(total_files, len(blob_results), index_time, analyze_time)
+
+def compare_serial_parallel(version_dirs, workers):
+    """对比串行与进程池并行分析的耗时，并校验结果一致"""
+    timings = {}
+    for version_dir in version_dirs:
+        serial = FlaskASTAnalyzer()
+        start = time.perf_counter()
+        serial.analyze_directory(version_dir)
+        serial_time = time.perf_counter() - start
+        
+        parallel = FlaskASTAnalyzer()
+        start = time.perf_counter()
+        parallel.analyze_directory(version_dir, workers=workers)
+        parallel_time = time.perf_counter() - start
+        
+        identical = (json.dumps(serial.stats, ensure_ascii=False) ==
+                     json.dumps(parallel.stats, ensure_ascii=False))
+        timings[os.path.basename(version_dir)] = {
+            "files": serial.stats["files_analyzed"],
+            "serial_seconds": round(serial_time, 4),
+            "parallel_seconds": round(parallel_time, 4),
+            "workers": workers,
+            "speedup": round(serial_time / parallel_time, 2) if parallel_time > 0 else 0,
+            "identical": identical
+        }
+    
+    print(f"\n{'版本':<16}{'文件数':>8}{'串行(s)':>10}{'并行(s)':>10}{'加速比':>8}  一致")
+    for version, t in timings.items():
+        print(f"{version:<16}{t['files']:>8}{t['serial_seconds']:>10.3f}"
+              f"{t['parallel_seconds']:>10.3f}{t['speedup']:>8.2f}  {t['identical']}")
+    
+    return timings
+
 if __name__ == "__main__":
     import sys
     import os
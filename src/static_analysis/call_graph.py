@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+静态调用图 - 记录函数间的调用边，按文件增量更新
+"""
+
+import os
+import ast
+import json
+import hashlib
+from array import array
+from collections import deque
+
+def module_name_for(rel_path):
+    """根据相对路径推导模块名，如 src/flask/app.py -> flask.app"""
+    parts = rel_path.replace("\\", "/").split("/")
+    if parts and parts[0] == "src":
+        parts = parts[1:]
+    if parts[-1].endswith(".py"):
+        parts[-1] = parts[-1][:-3]
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+def _resolve_relative(module, is_package, level, target):
+    """解析相对导入 from ..x import y 中的模块部分"""
+    if level == 0:
+        return target or ""
+    base = module.split(".") if module else []
+    if not is_package:
+        base = base[:-1]
+    if level > 1:
+        base = base[:len(base) - (level - 1)]
+    if target:
+        base = base + target.split(".")
+    return ".".join(base)
+
+class _CallExtractor:
+    """单文件调用边提取器：先收集定义和导入，再记录每个调用所在的函数"""
+
+    def __init__(self, module, is_package):
+        self.module = module
+        self.is_package = is_package
+        self.imports = {}     # 本地名 -> 完整限定名
+        self.defs = []        # 本文件定义的函数/方法/类的限定名
+        self.edges = []       # (调用方, 被调用方候选名)
+        self.bases = {}       # 类限定名 -> 基类候选名
+        self._top_level = {}  # 模块级函数和类名 -> 限定名
+
+    def extract(self, tree):
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self._top_level[node.name] = f"{self.module}.{node.name}"
+        self._visit_body(tree.body, self.module, None)
+        return self
+
+    def _visit_body(self, body, scope, class_name):
+        for node in body:
+            self._visit_stmt(node, scope, class_name)
+
+    def _visit_stmt(self, node, scope, class_name):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            qname = f"{scope}.{node.name}"
+            self.defs.append(qname)
+            for expr in node.decorator_list:
+                self._visit_expr(expr, scope, class_name)
+            # 函数体内self/cls指向外层类
+            self._visit_body(node.body, qname, class_name)
+        elif isinstance(node, ast.ClassDef):
+            qname = f"{scope}.{node.name}"
+            self.defs.append(qname)
+            self.bases[qname] = [b for b in (self._callee_name(base, None) for base in node.bases) if b]
+            for expr in node.bases + node.decorator_list:
+                self._visit_expr(expr, scope, class_name)
+            self._visit_body(node.body, qname, qname)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    self.imports[alias.asname] = alias.name
+                else:
+                    top = alias.name.split(".")[0]
+                    self.imports[top] = top
+        elif isinstance(node, ast.ImportFrom):
+            base = _resolve_relative(self.module, self.is_package, node.level, node.module)
+            for alias in node.names:
+                if alias.name != "*":
+                    self.imports[alias.asname or alias.name] = f"{base}.{alias.name}" if base else alias.name
+        else:
+            for field, value in ast.iter_fields(node):
+                if isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, ast.stmt):
+                            self._visit_stmt(item, scope, class_name)
+                        elif isinstance(item, ast.AST):
+                            self._visit_expr(item, scope, class_name)
+                elif isinstance(value, ast.AST):
+                    self._visit_expr(value, scope, class_name)
+
+    def _visit_expr(self, node, scope, class_name):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, ast.Call):
+                callee = self._callee_name(current.func, class_name)
+                if callee:
+                    self.edges.append((scope, callee))
+            for child in ast.iter_child_nodes(current):
+                if isinstance(child, ast.stmt):
+                    self._visit_stmt(child, scope, class_name)
+                else:
+                    stack.append(child)
+
+    def _callee_name(self, func, class_name):
+        """把调用表达式解析为限定名候选；无法解析的返回None"""
+        if isinstance(func, ast.Name):
+            name = func.id
+            if name in self._top_level:
+                return self._top_level[name]
+            if name in self.imports:
+                return self.imports[name]
+            return name  # 内置函数或未知名称，保留原名
+        if isinstance(func, ast.Attribute):
+            parts = []
+            value = func
+            while isinstance(value, ast.Attribute):
+                parts.append(value.attr)
+                value = value.value
+            if not isinstance(value, ast.Name):
+                return None
+            parts.reverse()
+            root = value.id
+            if root in ("self", "cls") and class_name is not None:
+                return ".".join([class_name] + parts)
+            if root in self.imports:
+                return ".".join([self.imports[root]] + parts)
+            if root in self._top_level:
+                return ".".join([self._top_level[root]] + parts)
+        return None
+
+def extract_file_calls(rel_path, source):
+    """提取单个文件的定义、导入和调用边，返回可序列化的记录"""
+    module = module_name_for(rel_path)
+    is_package = os.path.basename(rel_path) == "__init__.py"
+    tree = ast.parse(source)
+    extractor = _CallExtractor(module, is_package).extract(tree)
+    return {
+        "module": module,
+        "defs": extractor.defs,
+        "imports": extractor.imports,
+        "edges": extractor.edges,
+        "bases": extractor.bases,
+    }
+
+def _iter_directory_sources(directory):
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.py'):
+                file_path = os.path.join(root, file)
+                with open(file_path, 'rb') as f:
+                    yield os.path.relpath(file_path, directory).replace("\\", "/"), f.read()
+
+class CallGraph:
+    """跨文件调用图
+
+    每个文件的提取结果按内容哈希保存，文件变化时只重新提取该文件；
+    查询前把全部边解析并压缩为CSR邻接表（array('i')），正反两个方向各一份。
+    """
+
+    def __init__(self):
+        self.files = {}  # 相对路径 -> {"hash":..., "module":..., "defs":..., "imports":..., "edges":...}
+        self._dirty = True
+        self.names = []
+        self.ids = {}
+        self.defined = set()
+
+    def update_file(self, rel_path, raw):
+        """更新单个文件（raw为bytes），内容未变时跳过；返回是否重新提取"""
+        digest = hashlib.sha256(raw).hexdigest()
+        record = self.files.get(rel_path)
+        if record is not None and record["hash"] == digest:
+            return False
+        try:
+            extracted = extract_file_calls(rel_path, raw.decode('utf-8'))
+        except Exception as e:
+            print(f"调用图提取失败 {rel_path}: {e}")
+            extracted = {"module": module_name_for(rel_path), "defs": [], "imports": {},
+                         "edges": [], "bases": {}}
+        extracted["hash"] = digest
+        self.files[rel_path] = extracted
+        self._dirty = True
+        return True
+
+    def remove_file(self, rel_path):
+        if self.files.pop(rel_path, None) is not None:
+            self._dirty = True
+
+    def update_sources(self, sources):
+        """与一组 (相对路径, 内容bytes) 同步：新增/修改的文件重新提取，缺失的文件移除"""
+        seen = set()
+        changed = 0
+        for rel_path, raw in sources:
+            seen.add(rel_path)
+            changed += self.update_file(rel_path, raw)
+        for rel_path in list(self.files):
+            if rel_path not in seen:
+                self.remove_file(rel_path)
+        return changed
+
+    def update_directory(self, directory):
+        """同步整个目录"""
+        return self.update_sources(_iter_directory_sources(directory))
+
+    def _resolve(self, name, exports, depth=0):
+        """把候选名解析到已定义的符号，处理包的再导出（如 flask.Flask -> flask.app.Flask）"""
+        if name in self.defined or depth > 5:
+            return name
+        parts = name.split(".")
+        for i in range(len(parts) - 1, 0, -1):
+            module = ".".join(parts[:i])
+            target = exports.get(module, {}).get(parts[i])
+            if target is not None:
+                return self._resolve(".".join([target] + parts[i + 1:]), exports, depth + 1)
+        return name
+
+    def _resolve_method(self, name, bases, depth=0):
+        """self.method 在本类未定义时沿基类查找"""
+        if name in self.defined or depth > 10:
+            return name
+        owner, _, method = name.rpartition(".")
+        for base in bases.get(owner, []):
+            candidate = self._resolve_method(f"{base}.{method}", bases, depth + 1)
+            if candidate in self.defined:
+                return candidate
+        return name
+
+    def _build(self):
+        if not self._dirty:
+            return
+        self.defined = set()
+        exports = {}
+        for record in self.files.values():
+            self.defined.update(record["defs"])
+            exports[record["module"]] = record["imports"]
+        bases = {}
+        for record in self.files.values():
+            for cls, candidates in record.get("bases", {}).items():
+                bases[cls] = [self._resolve(c, exports) for c in candidates]
+
+        self.names = []
+        self.ids = {}
+        resolved = {}
+
+        def node_id(name):
+            node = self.ids.get(name)
+            if node is None:
+                node = len(self.names)
+                self.ids[name] = node
+                self.names.append(name)
+            return node
+
+        for name in sorted(self.defined):
+            node_id(name)
+
+        edge_set = set()
+        for record in self.files.values():
+            for caller, callee in record["edges"]:
+                target = resolved.get(callee)
+                if target is None:
+                    target = self._resolve_method(self._resolve(callee, exports), bases)
+                    # 调用类等同于调用其构造函数；本类未定义 __init__ 时沿基类查找继承的构造函数
+                    if target in bases:
+                        init = self._resolve_method(f"{target}.__init__", bases)
+                        if init in self.defined:
+                            target = init
+                    resolved[callee] = target
+                edge_set.add((node_id(caller), node_id(target)))
+
+        self.forward = self._csr(edge_set, len(self.names), reverse=False)
+        self.backward = self._csr(edge_set, len(self.names), reverse=True)
+        self.edge_count = len(edge_set)
+        self._dirty = False
+
+    @staticmethod
+    def _csr(edge_set, node_count, reverse):
+        """由边集合构建CSR邻接表 (indptr, indices)"""
+        counts = [0] * (node_count + 1)
+        for src, dst in edge_set:
+            counts[(dst if reverse else src) + 1] += 1
+        for i in range(node_count):
+            counts[i + 1] += counts[i]
+        indptr = array('i', counts)
+        indices = array('i', bytes(4 * len(edge_set)))
+        cursor = list(counts[:-1])
+        for src, dst in sorted(edge_set):
+            if reverse:
+                src, dst = dst, src
+            indices[cursor[src]] = dst
+            cursor[src] += 1
+        return indptr, indices
+
+    def _neighbors(self, graph, node):
+        indptr, indices = graph
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def callees(self, name):
+        self._build()
+        node = self.ids.get(name)
+        return [] if node is None else [self.names[i] for i in self._neighbors(self.forward, node)]
+
+    def callers(self, name):
+        self._build()
+        node = self.ids.get(name)
+        return [] if node is None else [self.names[i] for i in self._neighbors(self.backward, node)]
+
+    def fan_out(self, name):
+        return len(self.callees(name))
+
+    def fan_in(self, name):
+        return len(self.callers(name))
+
+    def reachable(self, name, internal_only=True):
+        """从某函数出发可达的全部函数（BFS）"""
+        self._build()
+        start = self.ids.get(name)
+        if start is None:
+            return []
+        seen = bytearray(len(self.names))
+        seen[start] = 1
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for nxt in self._neighbors(self.forward, node):
+                if not seen[nxt]:
+                    seen[nxt] = 1
+                    queue.append(nxt)
+        result = [self.names[i] for i in range(len(self.names)) if seen[i] and i != start]
+        if internal_only:
+            result = [n for n in result if n in self.defined]
+        return result
+
+    def top(self, direction="in", n=10):
+        """按扇入或扇出排序的已定义函数"""
+        self._build()
+        indptr = (self.backward if direction == "in" else self.forward)[0]
+        degrees = [(indptr[i + 1] - indptr[i], self.names[i])
+                   for i in range(len(self.names)) if self.names[i] in self.defined]
+        degrees.sort(key=lambda x: (-x[0], x[1]))
+        return [{"name": name, "degree": degree} for degree, name in degrees[:n]]
+
+    def stats(self):
+        self._build()
+        return {
+            "files": len(self.files),
+            "nodes": len(self.names),
+            "defined": len(self.defined),
+            "edges": self.edge_count,
+        }
+
+    def save(self, state_file):
+        """保存各文件的提取结果，供下次增量更新"""
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump(self.files, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, state_file):
+        graph = cls()
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    graph.files = {path: {**record, "edges": [tuple(e) for e in record["edges"]]}
+                                   for path, record in json.load(f).items()}
+            except Exception as e:
+                print(f"读取调用图状态失败 {state_file}: {e}")
+        return graph
+
+def build_version_call_graph(version_dir, output_dir, entry="flask.app.Flask.wsgi_app", sources=None):
+    """构建（或增量更新）某个版本的调用图并保存摘要
+
+    sources不为空时从其中的 (相对路径, 内容bytes) 读取源码（如git blob），
+    此时version_dir只用于确定版本名。
+    """
+    version_output_dir = os.path.join(output_dir, os.path.basename(version_dir))
+    state_file = os.path.join(version_output_dir, "call_graph_state.json")
+
+    graph = CallGraph.load(state_file)
+    if sources is None:
+        changed = graph.update_directory(version_dir)
+    else:
+        changed = graph.update_sources(sources)
+    graph.save(state_file)
+
+    summary = {
+        **graph.stats(),
+        "files_reextracted": changed,
+        "entry": entry,
+        "reachable_from_entry": len(graph.reachable(entry)),
+        "top_fan_in": graph.top("in"),
+        "top_fan_out": graph.top("out"),
+    }
+    with open(os.path.join(version_output_dir, "call_graph_summary.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print(f"调用图 {os.path.basename(version_dir)}: {summary['defined']} 个定义, "
+          f"{summary['edges']} 条边, 重新提取 {changed} 个文件, "
+          f"{entry} 可达 {summary['reachable_from_entry']} 个函数")
+    return graph, summary
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+批量代码改写 - 对整个版本目录并行运行一组LibCST转换pass，只写回有变化的文件
+"""
+
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import libcst as cst
+
+from static_analysis.ast_analyzer import list_python_files
+from static_analysis.libcst_modifier import TransformedModule, apply_passes
+
+def pass_signature(passes):
+    """转换链的标识：注册名或转换器类的完整名称"""
+    names = []
+    for item in passes:
+        if isinstance(item, str):
+            names.append(item)
+        else:
+            cls = item if isinstance(item, type) else type(item)
+            names.append(f"{cls.__module__}.{cls.__qualname__}")
+    return names
+
+def _line_counts(diff):
+    added = removed = 0
+    for line in diff.splitlines():
+        if line.startswith("+") and not line.startswith("+++"):
+            added += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            removed += 1
+    return added, removed
+
+def _transform_worker(task):
+    """进程池工作函数：对 (路径, 相对路径, 内容bytes, 转换链, 是否只预览) 运行转换
+
+    有变化且不是只预览时直接在子进程中写回。返回 (路径, 新内容哈希或None, unified diff, 错误信息)；
+    未变化时新内容哈希为None。
+    """
+    file_path, rel_path, raw, passes, dry_run = task
+    try:
+        code = raw.decode('utf-8')
+        transformed = TransformedModule(rel_path, code, apply_passes(cst.parse_module(code), passes), passes)
+        if not transformed.changed:
+            return file_path, None, "", None
+        if not dry_run:
+            transformed.write(file_path)
+        return (file_path, hashlib.sha256(transformed.code.encode('utf-8')).hexdigest(),
+                transformed.diff(), None)
+    except Exception as e:
+        return file_path, None, "", str(e)
+
+class CodemodRunner:
+    """把转换链应用到目录树
+
+    state_file记录每个文件上次处理后的内容哈希（及所用转换链），
+    再次运行时内容未变的文件直接跳过，不读取语法树。
+    """
+
+    def __init__(self, passes, workers=None, state_file=None):
+        self.passes = list(passes)
+        self.signature = pass_signature(self.passes)
+        self.workers = workers
+        self.state_file = state_file
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if self.state_file is None or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取改写状态失败 {self.state_file}: {e}")
+            return {}
+        # 转换链变化后旧记录全部失效
+        return data.get("files", {}) if data.get("passes") == self.signature else {}
+
+    def _save_state(self):
+        if self.state_file is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"passes": self.signature, "files": self.state}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_file)
+
+    def run(self, directory, dry_run=False, diff_file=None):
+        """改写directory下的全部Python文件，返回统计摘要
+
+        dry_run为True时只生成diff不写回；diff_file不为空时把完整diff写入该文件。
+        """
+        start = time.perf_counter()
+        tasks = []
+        skipped = 0
+        digests = {}
+        for file_path in list_python_files(directory):
+            rel_path = os.path.relpath(file_path, directory).replace("\\", "/")
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if self.state.get(rel_path) == digest:
+                skipped += 1
+                continue
+            digests[file_path] = (rel_path, digest)
+            tasks.append((file_path, rel_path, raw, self.passes, dry_run))
+
+        if self.workers and self.workers > 1 and tasks:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_transform_worker, tasks,
+                                            chunksize=max(1, len(tasks) // (self.workers * 4))))
+        else:
+            results = [_transform_worker(task) for task in tasks]
+
+        changed = []
+        errors = []
+        diffs = []
+        for file_path, new_digest, diff, error in results:
+            rel_path, digest = digests[file_path]
+            if error is not None:
+                errors.append({"file": rel_path, "error": error})
+                continue
+            if new_digest is None:
+                self.state[rel_path] = digest
+                continue
+            added, removed = _line_counts(diff)
+            changed.append({"file": rel_path, "added": added, "removed": removed})
+            diffs.append(diff)
+            if not dry_run:
+                # 文件已由TransformedModule.write写回
+                self.state[rel_path] = new_digest
+
+        if not dry_run:
+            self._save_state()
+        if diff_file is not None:
+            with open(diff_file, 'w', encoding='utf-8') as f:
+                f.write("".join(diffs))
+
+        summary = {
+            "directory": directory,
+            "passes": self.signature,
+            "files_total": len(tasks) + skipped,
+            "files_skipped": skipped,
+            "files_transformed": len(tasks),
+            "files_changed": len(changed),
+            "lines_added": sum(item["added"] for item in changed),
+            "lines_removed": sum(item["removed"] for item in changed),
+            "errors": errors,
+            "changed": changed,
+            "dry_run": dry_run,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+        _print_diff_summary(summary)
+        return summary
+
+def _print_diff_summary(summary):
+    action = "将修改" if summary["dry_run"] else "已修改"
+    print(f"{summary['directory']}: {summary['files_total']} 个文件，跳过未变化 {summary['files_skipped']} 个，"
+          f"转换 {summary['files_transformed']} 个，{action} {summary['files_changed']} 个 "
+          f"(+{summary['lines_added']} -{summary['lines_removed']})，耗时 {summary['seconds']:.2f}s")
+    for item in summary["changed"]:
+        print(f"  {item['file']} | +{item['added']} -{item['removed']}")
+    for item in summary["errors"]:
+        print(f"  转换失败 {item['file']}: {item['error']}")
+
+def run_codemod(directories, passes, workers=None, state_dir=None, dry_run=False, diff_dir=None):
+    """对多个版本目录运行同一转换链，每个目录单独记录状态和diff"""
+    results = {}
+    for directory in directories:
+        name = os.path.basename(os.path.normpath(directory))
+        state_file = None
+        if state_dir:
+            # 状态文件按绝对路径区分，同名的不同目录不会互相覆盖
+            path_key = hashlib.sha256(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16]
+            state_file = os.path.join(state_dir, f"{name}-{path_key}.json")
+        diff_file = None
+        if diff_dir is not None:
+            os.makedirs(diff_dir, exist_ok=True)
+            diff_file = os.path.join(diff_dir, f"{name}.diff")
+        runner = CodemodRunner(passes, workers=workers, state_file=state_file)
+        results[name] = runner.run(directory, dry_run=dry_run, diff_file=diff_file)
+    return results
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+列式存储 - 以Parquet保存函数、类、导入明细（可选依赖pyarrow）
+"""
+
+import os
+import json
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+MANIFEST_FILE = "manifest.json"
+TABLE_FILES = {
+    "function": "functions.parquet",
+    "class": "classes.parquet",
+    "import": "imports.parquet",
+}
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("列式存储需要pyarrow，请运行: pip install pyarrow")
+
+def _schemas():
+    """各明细表的列类型；file列使用字典编码，数值列为定长整数"""
+    file_type = pa.dictionary(pa.int32(), pa.string())
+    return {
+        "function": pa.schema([
+            ("file", file_type),
+            ("name", pa.string()),
+            ("line", pa.int32()),
+            ("args", pa.int32()),
+            ("lines", pa.int32()),
+            ("decorators", pa.list_(pa.string())),
+            ("is_async", pa.bool_()),
+            ("scope", pa.string()),
+            ("is_method", pa.bool_()),
+            ("complexity", pa.int32()),
+            ("cognitive", pa.int32()),
+            ("max_nesting", pa.int32()),
+            ("branches", pa.int32()),
+        ]),
+        "class": pa.schema([
+            ("file", file_type),
+            ("name", pa.string()),
+            ("line", pa.int32()),
+            ("methods", pa.int32()),
+            ("bases", pa.list_(pa.string())),
+            ("method_names", pa.list_(pa.string())),
+            ("scope", pa.string()),
+        ]),
+        # 每行对应一个导入名，stmt为导入语句序号（同一语句的多个名称共享）
+        "import": pa.schema([
+            ("file", file_type),
+            ("stmt", pa.int32()),
+            ("module", pa.string()),
+            ("name", pa.string()),
+            ("alias", pa.string()),
+            ("level", pa.int32()),
+            ("type", pa.dictionary(pa.int8(), pa.string())),
+        ]),
+    }
+
+class ParquetResultWriter:
+    """按行组批量写出明细的列式写入器，可作为FlaskASTAnalyzer的sink使用"""
+
+    def __init__(self, output_dir, row_group_size=65536):
+        _require_pyarrow()
+        self.output_dir = output_dir
+        self.row_group_size = row_group_size
+        self.schemas = _schemas()
+        self.files_analyzed = 0
+        self.counts = {kind: 0 for kind in TABLE_FILES}
+        self.import_statements = 0
+        self._buffers = {kind: {name: [] for name in schema.names}
+                         for kind, schema in self.schemas.items()}
+        self._writers = {}
+        self._closed = False
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write_file_result(self, result):
+        """写入单个文件的全部明细记录"""
+        if "file_stats" in result:
+            self.files_analyzed += 1
+        for record in result["function_details"]:
+            self._append("function", record)
+        for record in result["class_details"]:
+            self._append("class", record)
+        for record in result["import_details"]:
+            stmt = self.import_statements
+            self.import_statements += 1
+            for item in record["imports"]:
+                self._append("import", {"file": record["file"], "stmt": stmt, **item})
+
+    def _append(self, kind, record):
+        buffer = self._buffers[kind]
+        for name, column in buffer.items():
+            column.append(record.get(name))
+        self.counts[kind] += 1
+        if len(buffer["file"]) >= self.row_group_size:
+            self._flush(kind)
+
+    def _flush(self, kind):
+        buffer = self._buffers[kind]
+        if not buffer["file"]:
+            return
+        schema = self.schemas[kind]
+        table = pa.Table.from_pydict(buffer, schema=schema)
+        writer = self._writers.get(kind)
+        if writer is None:
+            path = os.path.join(self.output_dir, TABLE_FILES[kind])
+            writer = pq.ParquetWriter(path, schema, compression="zstd")
+            self._writers[kind] = writer
+        writer.write_table(table)
+        for column in buffer.values():
+            column.clear()
+
+    def close(self):
+        if self._closed:
+            return
+        for kind in TABLE_FILES:
+            self._flush(kind)
+            if kind not in self._writers:
+                # 没有记录时也写出空表，保证读取端列结构一致
+                empty = self.schemas[kind].empty_table()
+                pq.write_table(empty, os.path.join(self.output_dir, TABLE_FILES[kind]))
+        for writer in self._writers.values():
+            writer.close()
+
+        manifest = {
+            "files_analyzed": self.files_analyzed,
+            "total_functions": self.counts["function"],
+            "total_classes": self.counts["class"],
+            "total_imports": self.import_statements,
+            "tables": TABLE_FILES,
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        self._closed = True
+
+def save_columnar(stats, output_dir):
+    """将FlaskASTAnalyzer.stats转换为列式存储"""
+    writer = ParquetResultWriter(output_dir)
+    writer.write_file_result(stats)
+    writer.files_analyzed = stats.get("files_analyzed", 0)
+    writer.close()
+    return output_dir
+
+def has_columnar(output_dir):
+    return os.path.exists(os.path.join(output_dir, MANIFEST_FILE))
+
+def load_totals(output_dir):
+    """只读取清单中的汇总数（不需要pyarrow）"""
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_table(output_dir, kind, columns=None):
+    """按需读取某张明细表的部分列，返回pandas DataFrame（file列为categorical）"""
+    _require_pyarrow()
+    path = os.path.join(output_dir, TABLE_FILES[kind])
+    read_dictionary = None
+    if columns is None or "file" in columns:
+        read_dictionary = ["file"]
+    table = pq.read_table(path, columns=columns, read_dictionary=read_dictionary)
+    return table.to_pandas()
+
+def benchmark_against_json(json_file, output_dir, columns=("name", "line", "args", "lines")):
+    """对比详细JSON与列式存储的体积和加载耗时"""
+    _require_pyarrow()
+
+    start = time.perf_counter()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        stats = json.load(f)
+    json_load = time.perf_counter() - start
+
+    save_columnar(stats, output_dir)
+    parquet_bytes = sum(os.path.getsize(os.path.join(output_dir, name))
+                        for name in TABLE_FILES.values())
+
+    start = time.perf_counter()
+    for kind in TABLE_FILES:
+        load_table(output_dir, kind)
+    parquet_full_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_table(output_dir, "function", columns=list(columns))
+    parquet_column_load = time.perf_counter() - start
+
+    result = {
+        "json_bytes": os.path.getsize(json_file),
+        "parquet_bytes": parquet_bytes,
+        "json_load_seconds": round(json_load, 4),
+        "parquet_full_load_seconds": round(parquet_full_load, 4),
+        "parquet_column_load_seconds": round(parquet_column_load, 4),
+        "columns": list(columns),
+    }
+    print(f"JSON: {result['json_bytes'] / 1024:.1f} KB，加载 {json_load * 1000:.1f} ms")
+    print(f"Parquet: {parquet_bytes / 1024:.1f} KB，全部加载 {parquet_full_load * 1000:.1f} ms，"
+          f"按列加载 {parquet_column_load * 1000:.1f} ms")
+    return result
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+复杂度指标 - 以NumPy数组保存函数级指标，计算分布、分位数和热点
+"""
+
+import os
+import json
+import numpy as np
+
+METRICS = ("complexity", "cognitive", "max_nesting", "branches", "lines", "args")
+PERCENTILES = (50, 75, 90, 95, 99)
+
+class FunctionMetrics:
+    """一个版本全部函数的指标数组，每个指标一列int32"""
+
+    def __init__(self, names, files, lines_at, values):
+        self.names = names          # 函数名列表
+        self.files = files          # 文件路径列表
+        self.lines_at = lines_at    # 定义所在行号 (np.ndarray)
+        self.values = values        # 指标名 -> np.ndarray
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_records(cls, records):
+        """由函数明细记录构建；记录中没有复杂度字段时返回None"""
+        records = list(records)
+        if records and "complexity" not in records[0]:
+            return None
+        count = len(records)
+        values = {metric: np.fromiter((r.get(metric) or 0 for r in records), dtype=np.int32, count=count)
+                  for metric in METRICS}
+        return cls([r["name"] for r in records], [r["file"] for r in records],
+                   np.fromiter((r["line"] for r in records), dtype=np.int32, count=count), values)
+
+    @classmethod
+    def from_version_dir(cls, version_dir):
+        """从某版本的分析输出加载函数指标（Parquet、JSONL 或 JSON）"""
+        columnar_dir = os.path.join(version_dir, "ast_columnar")
+        jsonl_file = os.path.join(version_dir, "ast_analysis_detailed.jsonl")
+        json_file = os.path.join(version_dir, "ast_analysis_detailed.json")
+
+        if os.path.exists(os.path.join(columnar_dir, "manifest.json")):
+            from static_analysis.columnar_store import load_table
+            df = load_table(columnar_dir, "function", columns=["file", "name", "line"] + list(METRICS))
+            if df["complexity"].isna().all():
+                return None
+            values = {metric: df[metric].fillna(0).to_numpy(dtype=np.int32) for metric in METRICS}
+            return cls(df["name"].tolist(), df["file"].astype(str).tolist(),
+                       df["line"].to_numpy(dtype=np.int32), values)
+        if os.path.exists(jsonl_file):
+            from static_analysis.result_stream import iter_records
+            return cls.from_records(iter_records(jsonl_file, "function"))
+        if os.path.exists(json_file):
+            with open(json_file, 'r', encoding='utf-8') as f:
+                return cls.from_records(json.load(f)["function_details"])
+        return None
+
+    def distribution(self, metric):
+        """某指标的均值、最大值和分位数"""
+        data = self.values[metric]
+        if data.size == 0:
+            return {"count": 0}
+        quantiles = np.percentile(data, PERCENTILES)
+        result = {
+            "count": int(data.size),
+            "mean": round(float(data.mean()), 2),
+            "max": int(data.max()),
+        }
+        for p, q in zip(PERCENTILES, quantiles):
+            result[f"p{p}"] = round(float(q), 2)
+        return result
+
+    def share_above(self, metric, threshold):
+        """指标超过阈值的函数占比"""
+        data = self.values[metric]
+        return float((data > threshold).mean()) if data.size else 0.0
+
+    def top(self, metric="complexity", n=10):
+        """指标最高的n个函数（热点）"""
+        data = self.values[metric]
+        n = min(n, data.size)
+        if n == 0:
+            return []
+        candidates = np.argpartition(-data, n - 1)[:n]
+        # 同值时按行号稳定排序
+        order = candidates[np.lexsort((self.lines_at[candidates], -data[candidates]))]
+        return [{
+            "name": self.names[i],
+            "file": self.files[i],
+            "line": int(self.lines_at[i]),
+            metric: int(data[i]),
+        } for i in order]
+
+def complexity_trends(version_metrics):
+    """各版本复杂度分布，version_metrics为 版本名 -> FunctionMetrics（按版本顺序）"""
+    trends = {}
+    for version, metrics in version_metrics.items():
+        if metrics is None:
+            continue
+        trends[version] = {
+            "functions": len(metrics),
+            "complexity": metrics.distribution("complexity"),
+            "cognitive": metrics.distribution("cognitive"),
+            "max_nesting": metrics.distribution("max_nesting"),
+            "branches": metrics.distribution("branches"),
+            "complex_share": round(metrics.share_above("complexity", 10), 4),
+        }
+    return trends
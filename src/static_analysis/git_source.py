@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Git对象源码读取 - 不检出、不复制，直接从git对象库读取指定标签的源文件
+"""
+
+import os
+import subprocess
+from collections import OrderedDict
+
+class GitBlobSource:
+    """通过常驻的 git cat-file --batch 进程读取blob，并按blob哈希缓存内容"""
+
+    def __init__(self, repo_path, max_cache_bytes=256 * 1024 * 1024):
+        self.repo_path = repo_path
+        self.max_cache_bytes = max_cache_bytes
+        self._cache = OrderedDict()  # blob哈希 -> bytes，按访问顺序排列
+        self._cache_bytes = 0
+        self._proc = None
+        self.blobs_read = 0
+        self.cache_hits = 0
+
+    def _batch(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        return self._proc
+
+    def list_files(self, rev, suffix=".py"):
+        """列出某个提交/标签下的文件，返回 [(路径, blob哈希)]，按路径排序"""
+        output = subprocess.run(
+            ["git", "ls-tree", "-r", "-z", f"{rev}^{{tree}}"],
+            cwd=self.repo_path, capture_output=True, check=True
+        ).stdout
+        files = []
+        for entry in output.split(b"\0"):
+            if not entry:
+                continue
+            meta, path = entry.split(b"\t", 1)
+            mode, obj_type, sha = meta.split(b" ")
+            path = path.decode('utf-8', errors='surrogateescape')
+            if obj_type == b"blob" and path.endswith(suffix):
+                files.append((path, sha.decode('ascii')))
+        return files
+
+    def read_blob(self, sha):
+        """读取blob内容（bytes），优先使用缓存"""
+        data = self._cache.get(sha)
+        if data is not None:
+            self._cache.move_to_end(sha)
+            self.cache_hits += 1
+            return data
+
+        proc = self._batch()
+        proc.stdin.write(sha.encode('ascii') + b"\n")
+        proc.stdin.flush()
+        header = proc.stdout.readline().split()
+        if len(header) < 3 or header[1] == b"missing":
+            raise KeyError(f"git对象不存在: {sha}")
+        size = int(header[2])
+        data = proc.stdout.read(size)
+        proc.stdout.read(1)  # 每个对象后跟一个换行符
+        self.blobs_read += 1
+
+        self._cache[sha] = data
+        self._cache_bytes += len(data)
+        while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+        return data
+
+    def iter_sources(self, rev, prefix=None):
+        """逐个产出 (虚拟路径, 内容bytes)；prefix为路径前缀，默认使用rev"""
+        prefix = rev if prefix is None else prefix
+        for path, sha in self.list_files(rev):
+            yield os.path.join(prefix, path), self.read_blob(sha)
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
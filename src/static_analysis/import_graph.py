@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+模块依赖图 - 由导入记录构建版本内的模块级依赖图，传递闭包以位集保存
+"""
+
+import os
+import json
+
+from static_analysis.call_graph import module_name_for, _resolve_relative
+
+IMPORT_GRAPH_FILE = "import_graph.json"
+IMPORT_GRAPH_DIFF_FILE = "import_graph_diff.json"
+
+def _iter_bits(bits):
+    """依次产出位集中为1的位序号"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def version_relpath(file_path, version_name):
+    """取版本目录之后的相对路径，兼容磁盘路径和 flask_<tag>/... 形式的虚拟路径"""
+    parts = file_path.replace("\\", "/").split("/")
+    if version_name in parts:
+        index = len(parts) - 1 - parts[::-1].index(version_name)
+        parts = parts[index + 1:]
+    return "/".join(parts)
+
+class ImportGraph:
+    """版本内的模块依赖图
+
+    每个模块对应一个整数编号，传递闭包为每个模块保存一个Python整数位集，
+    第j位为1表示该模块（直接或间接）导入了模块j。闭包按强连通分量在
+    缩点后的DAG上逆拓扑序求得，每条边只做一次按位或。
+    """
+
+    def __init__(self):
+        self.modules = {}    # 模块名 -> {"file":..., "is_package":...}
+        self._imports = {}   # 模块名 -> [(module, name, level)]
+        self._dirty = True
+        self.names = []
+        self.ids = {}
+        self.external = {}   # 模块名 -> 依赖的外部顶层包
+        self.closure = []
+        self.components = []
+
+    def add_file(self, rel_path, import_details):
+        """加入一个文件及其导入记录（FlaskASTAnalyzer的import_details格式）"""
+        module = module_name_for(rel_path)
+        if not module:
+            return
+        self.modules[module] = {
+            "file": rel_path,
+            "is_package": os.path.basename(rel_path) == "__init__.py",
+        }
+        self._imports[module] = [
+            (item.get("module") or "", item.get("name"), item.get("level") or 0)
+            for record in import_details for item in record["imports"]
+        ]
+        self._dirty = True
+
+    def _internal_prefix(self, name):
+        """name或其最长的、属于本版本的前缀模块"""
+        parts = name.split(".")
+        for i in range(len(parts), 0, -1):
+            candidate = ".".join(parts[:i])
+            if candidate in self.modules:
+                return candidate
+        return None
+
+    def _resolve(self, module, target, name, level):
+        """把一条导入解析为本版本内的模块名；外部依赖返回 (None, 顶层包名)"""
+        if name is None:
+            # import a.b.c
+            full = target
+        else:
+            base = _resolve_relative(module, self.modules[module]["is_package"], level, target)
+            # from pkg import submodule 时依赖指向子模块
+            full = f"{base}.{name}" if base and name != "*" else base
+        internal = self._internal_prefix(full) if full else None
+        if internal is not None:
+            return internal, None
+        if level == 0 and full:
+            return None, full.split(".")[0]
+        return None, None
+
+    def _build(self):
+        if not self._dirty:
+            return
+        self.names = sorted(self.modules)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.adjacency = [[] for _ in self.names]
+        self.external = {}
+        edge_count = 0
+        for module, imports in self._imports.items():
+            src = self.ids[module]
+            targets = set()
+            external = set()
+            for target, name, level in imports:
+                internal, package = self._resolve(module, target, name, level)
+                if internal is not None and internal != module:
+                    targets.add(self.ids[internal])
+                elif package:
+                    external.add(package)
+            self.adjacency[src] = sorted(targets)
+            edge_count += len(targets)
+            if external:
+                self.external[module] = sorted(external)
+        self.edge_count = edge_count
+        self._compute_closure()
+        self._dirty = False
+
+    def _strongly_connected(self):
+        """迭代版Tarjan算法，按逆拓扑序（被依赖者在前）返回强连通分量"""
+        count = len(self.names)
+        index = [-1] * count
+        low = [0] * count
+        on_stack = bytearray(count)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, pos = work.pop()
+                if pos == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = 1
+                neighbors = self.adjacency[node]
+                while pos < len(neighbors):
+                    nxt = neighbors[pos]
+                    pos += 1
+                    if index[nxt] == -1:
+                        work.append((node, pos))
+                        work.append((nxt, 0))
+                        break
+                    if on_stack[nxt]:
+                        low[node] = min(low[node], index[nxt])
+                else:
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+        return components
+
+    def _compute_closure(self):
+        self.components = self._strongly_connected()
+        component_of = [0] * len(self.names)
+        masks = []
+        for c, members in enumerate(self.components):
+            mask = 0
+            for node in members:
+                component_of[node] = c
+                mask |= 1 << node
+            masks.append(mask)
+
+        reach = [0] * len(self.components)
+        for c, members in enumerate(self.components):
+            bits = masks[c] if len(members) > 1 else 0
+            for node in members:
+                for nxt in self.adjacency[node]:
+                    d = component_of[nxt]
+                    if d != c:
+                        bits |= masks[d] | reach[d]
+            reach[c] = bits
+        self.closure = [reach[component_of[node]] for node in range(len(self.names))]
+
+    def _names_of(self, bits):
+        return [self.names[i] for i in _iter_bits(bits)]
+
+    def imports(self, module):
+        """直接导入的本版本模块"""
+        self._build()
+        node = self.ids.get(module)
+        return [] if node is None else [self.names[i] for i in self.adjacency[node]]
+
+    def dependencies(self, module):
+        """模块（直接或间接）导入的全部模块"""
+        self._build()
+        node = self.ids.get(module)
+        if node is None:
+            return []
+        return self._names_of(self.closure[node] & ~(1 << node))
+
+    def dependents(self, module):
+        """（直接或间接）导入了该模块的全部模块"""
+        self._build()
+        node = self.ids.get(module)
+        if node is None:
+            return []
+        return [self.names[i] for i, bits in enumerate(self.closure) if i != node and bits >> node & 1]
+
+    def depends_on(self, module, target):
+        self._build()
+        node, other = self.ids.get(module), self.ids.get(target)
+        if node is None or other is None:
+            return False
+        return bool(self.closure[node] >> other & 1)
+
+    def in_cycle(self, module):
+        self._build()
+        node = self.ids.get(module)
+        return node is not None and bool(self.closure[node] >> node & 1)
+
+    def cycles(self):
+        """导入环（包含多个模块的强连通分量）"""
+        self._build()
+        cycles = [sorted(self.names[i] for i in members)
+                  for members in self.components if len(members) > 1]
+        cycles.sort(key=lambda c: (-len(c), c))
+        return cycles
+
+    def edges(self):
+        self._build()
+        return {(self.names[src], self.names[dst])
+                for src, targets in enumerate(self.adjacency) for dst in targets}
+
+    def top(self, direction="dependencies", n=10):
+        """传递依赖最多（dependencies）或被依赖最多（dependents）的模块"""
+        self._build()
+        if direction == "dependencies":
+            sizes = [bin(bits & ~(1 << i)).count("1") for i, bits in enumerate(self.closure)]
+        else:
+            sizes = [0] * len(self.names)
+            for i, bits in enumerate(self.closure):
+                for j in _iter_bits(bits & ~(1 << i)):
+                    sizes[j] += 1
+        ranked = sorted(range(len(self.names)), key=lambda i: (-sizes[i], self.names[i]))
+        return [{"module": self.names[i], "count": sizes[i]} for i in ranked[:n]]
+
+    def stats(self):
+        self._build()
+        return {
+            "modules": len(self.names),
+            "edges": self.edge_count,
+            "cycles": len(self.cycles()),
+            "modules_in_cycles": sum(len(c) for c in self.cycles()),
+        }
+
+    def save(self, output_file):
+        """保存模块、直接依赖和十六进制位集形式的传递闭包"""
+        self._build()
+        data = {
+            **self.stats(),
+            "modules_info": self.modules,
+            "imports": {name: self.imports(name) for name in self.names},
+            "external": self.external,
+            "closure": {name: format(bits, "x") for name, bits in zip(self.names, self.closure)},
+            "cycle_list": self.cycles(),
+            "top_dependencies": self.top("dependencies"),
+            "top_dependents": self.top("dependents"),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, input_file):
+        """从save的输出恢复，直接使用保存的位集，不重新计算闭包"""
+        with open(input_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        graph = cls()
+        graph.modules = data["modules_info"]
+        graph.names = sorted(graph.modules)
+        graph.ids = {name: i for i, name in enumerate(graph.names)}
+        graph.adjacency = [[graph.ids[t] for t in data["imports"].get(name, [])] for name in graph.names]
+        graph._imports = {name: [] for name in graph.names}
+        graph.external = data.get("external", {})
+        graph.edge_count = sum(len(targets) for targets in graph.adjacency)
+        graph.closure = [int(data["closure"][name], 16) for name in graph.names]
+        cycle_ids = [[graph.ids[name] for name in cycle] for cycle in data.get("cycle_list", [])]
+        in_cycle = {node for cycle in cycle_ids for node in cycle}
+        graph.components = cycle_ids + [[i] for i in range(len(graph.names)) if i not in in_cycle]
+        graph._dirty = False
+        return graph
+
+class ImportGraphWriter:
+    """接收每个文件分析结果的监听器，分析结束时保存该版本的依赖图"""
+
+    def __init__(self, version_name, output_file):
+        self.version_name = version_name
+        self.output_file = output_file
+        self.graph = ImportGraph()
+
+    def write_file_result(self, result):
+        rel_path = version_relpath(result["file_stats"]["file"], self.version_name)
+        self.graph.add_file(rel_path, result["import_details"])
+
+    def close(self):
+        self.graph.save(self.output_file)
+
+def diff_import_graphs(old, new):
+    """对比两个版本依赖图的模块、边和导入环"""
+    old_modules, new_modules = set(old.modules), set(new.modules)
+    old_edges, new_edges = old.edges(), new.edges()
+    old_cycles = {tuple(c) for c in old.cycles()}
+    new_cycles = {tuple(c) for c in new.cycles()}
+    return {
+        "added_modules": sorted(new_modules - old_modules),
+        "removed_modules": sorted(old_modules - new_modules),
+        "added_edges": sorted(new_edges - old_edges),
+        "removed_edges": sorted(old_edges - new_edges),
+        "new_cycles": sorted(list(c) for c in new_cycles - old_cycles),
+        "resolved_cycles": sorted(list(c) for c in old_cycles - new_cycles),
+    }
+
+def diff_version_import_graphs(output_dir, version_names):
+    """依次对比相邻版本的依赖图，结果保存为 import_graph_diff.json"""
+    graphs = {}
+    for version_name in version_names:
+        graph_file = os.path.join(output_dir, version_name, IMPORT_GRAPH_FILE)
+        if os.path.exists(graph_file):
+            graphs[version_name] = ImportGraph.load(graph_file)
+
+    names = list(graphs)
+    diffs = {}
+    for v1, v2 in zip(names, names[1:]):
+        diff = diff_import_graphs(graphs[v1], graphs[v2])
+        diffs[f"{v1} → {v2}"] = diff
+        print(f"依赖图 {v1} → {v2}: 新增 {len(diff['added_edges'])} 条边, "
+              f"删除 {len(diff['removed_edges'])} 条边, 新增导入环 {len(diff['new_cycles'])} 个")
+
+    with open(os.path.join(output_dir, IMPORT_GRAPH_DIFF_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "versions": {name: graph.stats() for name, graph in graphs.items()},
+            "diffs": diffs,
+        }, f, indent=2, ensure_ascii=False)
+    return diffs
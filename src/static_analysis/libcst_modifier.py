@@ -6,22 +6,129 @@ LibCST分析器 - 代码修改和模式分析
 
 import libcst as cst
 import os
+import json
+import time
+import shutil
+import difflib
+import hashlib
 from typing import Dict, List
 from collections import defaultdict 
+from concurrent.futures import ProcessPoolExecutor
+
+from static_analysis.analysis_cache import AnalysisCache
+from static_analysis.call_graph import module_name_for
+from static_analysis.import_graph import version_relpath
+from static_analysis.name_resolution import QualifiedNameResolver, RESOLVER_VERSION
+from static_analysis.parse_cache import ParsedModuleCache, LIBCST_VERSION
+from static_analysis.pattern_rules import PatternEngine, TokenPrefilter, FLASK_RULES
+
+_QUALIFIED_RULES = {rule.name for rule in FLASK_RULES if rule.qualified_names}
+
+# 已注册的转换pass：名称 -> CSTTransformer子类
+TRANSFORM_PASSES = {}
+
+def register_pass(name):
+    """类装饰器，把CSTTransformer子类注册为可按名称启用的转换pass"""
+    def decorator(cls):
+        TRANSFORM_PASSES[name] = cls
+        return cls
+    return decorator
+
+def apply_passes(tree, passes):
+    """依次运行转换pass，passes中的元素可以是注册名、转换器类或实例"""
+    for item in passes:
+        if isinstance(item, str):
+            item = TRANSFORM_PASSES[item]
+        if isinstance(item, type):
+            item = item()
+        tree = tree.visit(item)
+    return tree
+
+class TransformedModule:
+    """转换后的模块；源码只在写出、对比或统计行数时才重新生成"""
+
+    def __init__(self, file_path, original_code, tree, passes):
+        self.file_path = file_path
+        self.original_code = original_code
+        self.tree = tree
+        self.passes = list(passes)
+        self._code = None
+
+    @property
+    def code(self):
+        if self._code is None:
+            self._code = self.tree.code
+        return self._code
+
+    @property
+    def changed(self):
+        return self.code != self.original_code
+
+    @property
+    def modified_lines(self):
+        return len(self.code.splitlines())
+
+    def diff(self, context=3):
+        """原始源码与转换结果的unified diff，未变化时为空字符串"""
+        if not self.changed:
+            return ""
+        name = self.file_path.replace("\\", "/").lstrip("/")
+        return "".join(difflib.unified_diff(
+            self.original_code.splitlines(keepends=True),
+            self.code.splitlines(keepends=True),
+            fromfile=f"a/{name}", tofile=f"b/{name}", n=context))
+
+    def write(self, output_path=None):
+        """写出转换结果（先写临时文件再替换），未变化时不写；返回是否写出
+
+        临时文件按默认权限新建，替换前沿用被覆盖文件（或原文件）的权限位。
+        """
+        if not self.changed:
+            return False
+        output_path = output_path or self.file_path
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(self.code)
+        mode_source = output_path if os.path.exists(output_path) else self.file_path
+        if os.path.exists(mode_source):
+            shutil.copymode(mode_source, tmp_path)
+        os.replace(tmp_path, output_path)
+        return True
 
 class FlaskLibCSTAnalyzer:
-    def __init__(self):
+    def __init__(self, parse_cache=None, passes=(), resolver=None, prefilter=True):
+        # analyze_file与find_flask_patterns共用的解析缓存，同一文件只解析一次
+        self.parse_cache = parse_cache if parse_cache is not None else ParsedModuleCache()
+        # 默认只做分析；给出转换pass时analyze_file同时运行这些pass
+        self.passes = list(passes)
+        # 模式规则只编译一次，统计在整个分析过程中累计
+        self.pattern_engine = PatternEngine()
+        # 可选的QualifiedNameResolver，设置后模式查找按限定名识别别名（元数据模式）
+        self.resolver = resolver
+        # 解析前按token预过滤，不可能命中任何规则的文件跳过解析
+        self.prefilter = TokenPrefilter(metadata=resolver is not None) if prefilter else None
         self.function_calls = defaultdict(int)
         self.decorators = defaultdict(int)
         self.class_hierarchy = {}
     
-    def analyze_file(self, file_path):
-        """使用LibCST分析文件"""
-        try:
+    def _parse(self, file_path, code=None):
+        """读取（必要时）并解析源码，返回 (源码str, Module)"""
+        if code is None:
             with open(file_path, 'r', encoding='utf-8') as f:
                 code = f.read()
-            
-            tree = cst.parse_module(code)
+        elif isinstance(code, bytes):
+            code = code.decode('utf-8')
+        return code, self.parse_cache.parse(file_path, code)
+    
+    def analyze_file(self, file_path, code=None, passes=None):
+        """使用LibCST分析文件，code不为空时直接分析内存中的源码（str或bytes）
+        
+        passes为要运行的转换pass（默认使用构造时给出的pass）；为空时只做分析，
+        否则结果中的 "transformed" 为TransformedModule，源码在需要时才生成。
+        """
+        passes = self.passes if passes is None else list(passes)
+        try:
+            code, tree = self._parse(file_path, code)
             
             # 访问器收集信息
             visitor = CodeVisitor()
@@ -34,56 +141,46 @@ class FlaskLibCSTAnalyzer:
             for dec, count in visitor.decorators.items():
                 self.decorators[dec] += count
             
-            # 转换器示例：将所有整数加1
-            transformer = IntTransformer()
-            modified_tree = tree.visit(transformer)
-            
-            return {
+            result = {
                 "original_lines": len(code.splitlines()),
-                "modified_lines": len(modified_tree.code.splitlines()),
                 "function_calls": dict(visitor.function_calls),
                 "decorators": dict(visitor.decorators)
             }
+            if passes:
+                result["transformed"] = TransformedModule(file_path, code, apply_passes(tree, passes), passes)
+            return result
             
         except Exception as e:
             print(f"LibCST分析失败 {file_path}: {e}")
             return None
     
-    def find_flask_patterns(self, file_path):
-        """查找Flask特定模式"""
-        patterns = {
-            "route_decorators": [],
-            "app_creation": False,
-            "blueprint_usage": False
-        }
+    def find_flask_patterns(self, file_path, code=None, rel_path=None):
+        """查找Flask特定模式，code不为空时直接分析内存中的源码（str或bytes）
+        
+        全部规则（见pattern_rules.FLASK_RULES）在一次遍历中匹配，
+        各规则的累计命中数和耗时见 self.pattern_engine.stats()。
+        rel_path为文件相对版本根目录的路径，元数据模式下用于确定模块名以解析相对导入。
+        """
+        patterns = _empty_patterns()
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code = f.read()
-            
-            tree = cst.parse_module(code)
-            
-            # 查找Flask路由装饰器
-            class RouteFinder(cst.CSTVisitor):
-                def __init__(self):
-                    self.routes = []
-                
-                def visit_Decorator(self, node):
-                    decorator_str = cst.Module([]).code_for_node(node)
-                    if "@app.route" in decorator_str or "@blueprint.route" in decorator_str:
-                        self.routes.append(decorator_str)
-            
-            finder = RouteFinder()
-            tree.visit(finder)
-            patterns["route_decorators"] = finder.routes
+            if self.prefilter is not None:
+                if code is None:
+                    with open(file_path, 'rb') as f:
+                        code = f.read()
+                if not self.prefilter.may_match(code):
+                    return patterns
+            code, tree = self._parse(file_path, code)
+            call_names = None
+            if self.resolver is not None:
+                call_names = self.resolver.call_names(tree, code, rel_path or file_path)
+            matches = self.pattern_engine.run(tree, call_names)
             
-            # 检查是否有Flask应用创建
-            if "Flask(" in code or "flask.Flask(" in code:
-                patterns["app_creation"] = True
-            
-            # 检查是否使用蓝图
-            if "Blueprint(" in code or "blueprint" in code.lower():
-                patterns["blueprint_usage"] = True
+            patterns["route_decorators"] = [tree.code_for_node(node) for node in matches.get("route", [])]
+            patterns["app_creation"] = "app_creation" in matches
+            patterns["blueprint_usage"] = ("blueprint_creation" in matches
+                                           or "blueprint_registration" in matches)
+            patterns["matches"] = {name: len(nodes) for name, nodes in matches.items()}
             
             return patterns
             
@@ -105,6 +202,7 @@ class CodeVisitor(cst.CSTVisitor):
         decorator_str = cst.Module([]).code_for_node(node.decorator)
         self.decorators[decorator_str] += 1
 
+@register_pass("int_increment")
 class IntTransformer(cst.CSTTransformer):
     """将所有整数加1的转换器（示例）"""
     def leave_Integer(self, original_node, updated_node):
@@ -114,38 +212,314 @@ class IntTransformer(cst.CSTTransformer):
         except:
             return updated_node
 
-def analyze_with_libcst(directory, output_file):
-    """使用LibCST分析整个目录"""
-    print(f"使用LibCST分析目录: {directory}")
-    
-    analyzer = FlaskLibCSTAnalyzer()
-    patterns_summary = {
+def iter_directory_files(directory):
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.py'):
+                yield os.path.join(root, file), None
+
+def _empty_patterns():
+    return {
+        "route_decorators": [],
+        "app_creation": False,
+        "blueprint_usage": False,
+        "matches": {}
+    }
+
+def _new_patterns_summary():
+    return {
         "total_files": 0,
         "files_with_routes": 0,
         "files_with_app": 0,
         "files_with_blueprint": 0,
-        "all_routes": []
+        "all_routes": [],
+        "pattern_counts": {}
     }
+
+def _add_file_patterns(patterns_summary, patterns):
+    """把单个文件的模式查找结果累计到汇总"""
+    patterns_summary["total_files"] += 1
+    if patterns["route_decorators"]:
+        patterns_summary["files_with_routes"] += 1
+        patterns_summary["all_routes"].extend(patterns["route_decorators"])
+    if patterns["app_creation"]:
+        patterns_summary["files_with_app"] += 1
+    if patterns["blueprint_usage"]:
+        patterns_summary["files_with_blueprint"] += 1
+
+def _save_json(data, output_file):
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def analyze_with_libcst(directory, output_file, sources=None, cache_dir=None, prefilter=True):
+    """使用LibCST分析整个目录
     
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.py'):
-                file_path = os.path.join(root, file)
-                patterns = analyzer.find_flask_patterns(file_path)
-                
-                patterns_summary["total_files"] += 1
-                if patterns["route_decorators"]:
-                    patterns_summary["files_with_routes"] += 1
-                    patterns_summary["all_routes"].extend(patterns["route_decorators"])
-                if patterns["app_creation"]:
-                    patterns_summary["files_with_app"] += 1
-                if patterns["blueprint_usage"]:
-                    patterns_summary["files_with_blueprint"] += 1
+    sources不为空时改为分析其中的 (文件路径, 内容bytes) 源码（如git blob），
+    不再读取directory。cache_dir不为空时解析结果持久化到该目录，供下次运行复用。
+    prefilter为True时只解析可能命中规则的文件。
+    """
+    print(f"使用LibCST分析目录: {directory}")
+    
+    analyzer = FlaskLibCSTAnalyzer(ParsedModuleCache(cache_dir=cache_dir), prefilter=prefilter)
+    patterns_summary = _new_patterns_summary()
+    
+    if sources is None:
+        sources = iter_directory_files(directory)
+    
+    for file_path, code in sources:
+        _add_file_patterns(patterns_summary, analyzer.find_flask_patterns(file_path, code))
+    
+    patterns_summary["pattern_counts"] = analyzer.pattern_engine.stats()
+    if analyzer.prefilter is not None:
+        patterns_summary["prefilter"] = analyzer.prefilter.stats()
+        print(f"预过滤: 扫描 {analyzer.prefilter.files_scanned} 个文件，解析 {analyzer.prefilter.files_passed} 个")
+    analyzer.parse_cache.save()
+    parse_stats = analyzer.parse_cache.stats()
+    print(f"LibCST解析: {parse_stats['parses']} 次解析 ({parse_stats['parse_seconds']:.3f}s)，"
+          f"磁盘缓存加载 {parse_stats['disk_hits']} 个 ({parse_stats['load_seconds']:.3f}s)")
     
     # 保存结果
-    import json
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(patterns_summary, f, indent=2, ensure_ascii=False)
+    _save_json(patterns_summary, output_file)
     
     print(f"LibCST分析完成！结果保存在: {output_file}")
-    return patterns_summary
\ No newline at end of file
+    return patterns_summary
+
+# 进程池中每个子进程各自持有一个分析器，规则只编译一次
+_worker_analyzer = None
+_worker_metadata = False
+
+def _counters(analyzer):
+    """分析器当前的累计计数：各规则 (匹配次数, 耗时, 仅元数据命中, 仅语法命中) 和解析器 (耗时, 解析文件数, 缓存命中)"""
+    engine = analyzer.pattern_engine
+    rules = {name: (engine.evaluations[name], engine.seconds[name],
+                    engine.metadata_only.get(name, 0), engine.syntax_only.get(name, 0))
+             for name in list(engine.evaluations)}
+    resolver = analyzer.resolver
+    resolve = (resolver.seconds, resolver.files_resolved, resolver.cache_hits) if resolver else (0.0, 0, 0)
+    return rules, resolve
+
+def _find_patterns_timed(analyzer, source):
+    """查找 (文件路径, 内容bytes, 相对路径) 的Flask模式
+
+    返回 (模式, 本文件各规则的计数增量, 限定名解析的计数增量)，供主进程累计统计。
+    """
+    rules_before, resolve_before = _counters(analyzer)
+    patterns = analyzer.find_flask_patterns(*source)
+    rules_after, resolve_after = _counters(analyzer)
+    zero = (0, 0.0, 0, 0)
+    timing = {name: tuple(a - b for a, b in zip(after, rules_before.get(name, zero)))
+              for name, after in rules_after.items()}
+    resolve = tuple(a - b for a, b in zip(resolve_after, resolve_before))
+    return patterns, timing, resolve
+
+def _init_pattern_worker(metadata):
+    global _worker_metadata
+    _worker_metadata = metadata
+
+def _pattern_worker(source):
+    """进程池工作函数，子进程的分析器在首次调用时创建"""
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        # 去重后每个文件只分析一次，不需要保留大量解析结果
+        # 预过滤已在主进程完成
+        _worker_analyzer = FlaskLibCSTAnalyzer(ParsedModuleCache(max_bytes=64 * 1024 * 1024),
+                                               resolver=QualifiedNameResolver() if _worker_metadata else None,
+                                               prefilter=False)
+    return _find_patterns_timed(_worker_analyzer, source)
+
+def _read_version_sources(version_sources, metadata=False):
+    """读取各版本源码并去重，返回 (各版本的 [(路径, 内容标识)], 内容标识 -> (路径, 内容, 相对路径))
+
+    元数据模式下相对导入的解析依赖模块名，内容标识同时包含模块名。
+    """
+    version_files = {}
+    blobs = {}
+    for version_name, sources in version_sources.items():
+        entries = []
+        for file_path, code in sources:
+            if code is None:
+                try:
+                    with open(file_path, 'rb') as f:
+                        code = f.read()
+                except OSError as e:
+                    print(f"读取文件失败 {file_path}: {e}")
+                    continue
+            elif isinstance(code, str):
+                code = code.encode('utf-8')
+            rel_path = version_relpath(file_path, version_name)
+            digest = hashlib.sha256()
+            if metadata:
+                digest.update(module_name_for(rel_path).encode('utf-8') + b"\0")
+            digest.update(code)
+            digest = digest.hexdigest()
+            entries.append((file_path, digest))
+            if digest not in blobs:
+                blobs[digest] = (file_path, code, rel_path)
+        version_files[version_name] = entries
+    return version_files, blobs
+
+def _serial_baseline(version_files, blobs, metadata=False):
+    """串行基线：按版本逐个文件分析（不去重、不用进程池），返回耗时"""
+    start = time.perf_counter()
+    for entries in version_files.values():
+        analyzer = FlaskLibCSTAnalyzer(resolver=QualifiedNameResolver() if metadata else None,
+                                       prefilter=False)
+        for file_path, digest in entries:
+            analyzer.find_flask_patterns(*blobs[digest])
+    return time.perf_counter() - start
+
+def _check_prefilter(skipped, blobs, metadata=False):
+    """对预过滤跳过的文件做不过滤的完整分析，返回实际命中了规则的文件（应为空）"""
+    analyzer = FlaskLibCSTAnalyzer(resolver=QualifiedNameResolver() if metadata else None,
+                                   prefilter=False)
+    mismatches = []
+    for digest in skipped:
+        patterns = analyzer.find_flask_patterns(*blobs[digest])
+        if patterns != _empty_patterns():
+            mismatches.append({"file": blobs[digest][2], "matches": patterns["matches"]})
+    return mismatches
+
+def analyze_versions_with_libcst(version_sources, output_dir, workers=None, cache_dir=None,
+                                 compare_serial=False, metadata=False, prefilter=True,
+                                 check_prefilter=False):
+    """并行分析多个版本的Flask模式
+    
+    version_sources为 版本名 -> 可迭代的 (文件路径, 内容bytes或None) 源码，
+    可用 {os.path.basename(d): iter_directory_files(d)} 分析多个目录。
+    跨版本内容相同的文件只分析一次，唯一文件分发到进程池。
+    cache_dir只在串行时使用（多个进程不共享磁盘解析缓存的索引）。
+    每个版本写出 output_dir/<版本>/libcst_analysis.json，并在output_dir写出
+    跨版本的模式对比表 libcst_patterns_by_version.json。
+    compare_serial为True时再串行分析一遍，报告与串行基线的耗时对比。
+    metadata为True时启用元数据模式：调用按完整限定名识别（可识别别名导入），
+    并报告与纯语法匹配的差异和元数据计算耗时；串行时结果缓存在 cache_dir/qualified_names。
+    prefilter为True时在主进程先按token扫描原始字节，只有可能命中规则的文件才解析；
+    check_prefilter为True时再完整分析被跳过的文件，确认结果与不过滤时一致。
+    """
+    start = time.perf_counter()
+    version_files, blobs = _read_version_sources(version_sources, metadata)
+    digests = list(blobs)
+    skipped = []
+    if prefilter:
+        token_filter = TokenPrefilter(metadata=metadata)
+        digests = []
+        for digest, (_, code, _) in blobs.items():
+            if token_filter.may_match(code):
+                digests.append(digest)
+            else:
+                skipped.append(digest)
+    sources = [blobs[digest] for digest in digests]
+    
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pattern_worker,
+                                 initargs=(metadata,)) as executor:
+            results = list(executor.map(_pattern_worker, sources,
+                                        chunksize=max(1, len(sources) // (workers * 4))))
+    else:
+        resolver = None
+        if metadata:
+            resolver_cache = None
+            if cache_dir is not None:
+                resolver_cache = AnalysisCache(os.path.join(cache_dir, "qualified_names"),
+                                               f"{RESOLVER_VERSION}-{LIBCST_VERSION}")
+            resolver = QualifiedNameResolver(resolver_cache)
+        analyzer = FlaskLibCSTAnalyzer(ParsedModuleCache(cache_dir=cache_dir), resolver=resolver,
+                                       prefilter=False)
+        results = [_find_patterns_timed(analyzer, source) for source in sources]
+        analyzer.parse_cache.save()
+        if resolver is not None:
+            resolver.save()
+    file_patterns = dict(zip(digests, (patterns for patterns, _, _ in results)))
+    for digest in skipped:
+        file_patterns[digest] = _empty_patterns()
+    
+    rule_timing = {}
+    resolve_totals = [0.0, 0, 0]
+    for _, timing, resolve in results:
+        for name, (evaluations, seconds, metadata_only, syntax_only) in timing.items():
+            total = rule_timing.setdefault(name, {"evaluations": 0, "seconds": 0.0})
+            total["evaluations"] += evaluations
+            total["seconds"] += seconds
+            if metadata:
+                total["metadata_only"] = total.get("metadata_only", 0) + metadata_only
+                total["syntax_only"] = total.get("syntax_only", 0) + syntax_only
+        for i, value in enumerate(resolve):
+            resolve_totals[i] += value
+    for total in rule_timing.values():
+        total["seconds"] = round(total["seconds"], 4)
+    
+    table = {}
+    summaries = {}
+    for version_name, entries in version_files.items():
+        patterns_summary = _new_patterns_summary()
+        hits = {}
+        files = {}
+        for file_path, digest in entries:
+            patterns = file_patterns[digest]
+            _add_file_patterns(patterns_summary, patterns)
+            for name, count in patterns["matches"].items():
+                hits[name] = hits.get(name, 0) + count
+                files[name] = files.get(name, 0) + 1
+        patterns_summary["pattern_counts"] = {name: {"hits": hits[name], "files": files[name]}
+                                              for name in sorted(hits)}
+        _save_json(patterns_summary, os.path.join(output_dir, version_name, "libcst_analysis.json"))
+        summaries[version_name] = patterns_summary
+        table[version_name] = {
+            "total_files": patterns_summary["total_files"],
+            "files_with_routes": patterns_summary["files_with_routes"],
+            "files_with_app": patterns_summary["files_with_app"],
+            "files_with_blueprint": patterns_summary["files_with_blueprint"],
+            "pattern_hits": {name: hits[name] for name in sorted(hits)},
+        }
+    elapsed = time.perf_counter() - start
+    
+    total_files = sum(len(entries) for entries in version_files.values())
+    timing = {
+        "workers": workers or 1,
+        "total_files": total_files,
+        "unique_files": len(blobs),
+        "wall_seconds": round(elapsed, 4),
+    }
+    if prefilter:
+        timing["prefilter"] = token_filter.stats()
+        if check_prefilter:
+            timing["prefilter"]["mismatches"] = _check_prefilter(skipped, blobs, metadata)
+    if compare_serial:
+        serial = _serial_baseline(version_files, blobs, metadata)
+        timing["serial_seconds"] = round(serial, 4)
+        timing["speedup"] = round(serial / elapsed, 2) if elapsed else None
+    
+    combined = {"versions": table, "rule_timing": rule_timing, "timing": timing}
+    if metadata:
+        # metadata_only: 仅按限定名命中（别名等语法匹配遗漏的调用）；
+        # syntax_only: 仅语法命中（同名但不是Flask类的误报）
+        combined["metadata"] = {
+            "resolve_seconds": round(resolve_totals[0], 4),
+            "files_resolved": resolve_totals[1],
+            "cache_hits": resolve_totals[2],
+            "matching_seconds": round(sum(t["seconds"] for t in rule_timing.values()), 4),
+            "rules": {name: {"metadata_only": t.get("metadata_only", 0),
+                             "syntax_only": t.get("syntax_only", 0)}
+                      for name, t in rule_timing.items()
+                      if name in _QUALIFIED_RULES},
+        }
+    _save_json(combined, os.path.join(output_dir, "libcst_patterns_by_version.json"))
+    
+    print(f"LibCST分析 {len(version_files)} 个版本: {total_files} 个文件中 {len(blobs)} 个唯一内容，"
+          f"{timing['workers']} 个进程耗时 {elapsed:.2f}s")
+    if prefilter:
+        info = timing["prefilter"]
+        print(f"预过滤: 扫描 {info['files_scanned']} 个唯一文件 ({info['scan_seconds']:.3f}s)，"
+              f"解析 {info['files_parsed']} 个，跳过 {info['files_skipped']} 个")
+        if check_prefilter:
+            print(f"预过滤校验: 跳过的文件中命中规则 {len(info['mismatches'])} 个（应为0）")
+    if compare_serial:
+        print(f"串行基线耗时 {timing['serial_seconds']:.2f}s，加速比 {timing['speedup']}x")
+    if metadata:
+        info = combined["metadata"]
+        print(f"元数据模式: 解析限定名 {info['files_resolved']} 个文件 ({info['resolve_seconds']:.2f}s)，"
+              f"缓存命中 {info['cache_hits']} 个")
+        for name, diff in info["rules"].items():
+            print(f"  {name}: 仅限定名命中 {diff['metadata_only']}，仅语法命中 {diff['syntax_only']}")
+    return summaries, timing
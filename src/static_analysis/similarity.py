@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+函数相似度 - 基于token shingle的MinHash签名和LSH分桶，识别跨版本移动或改名的函数
+"""
+
+import ast
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 32
+LSH_BANDS = 8
+# 估计的Jaccard相似度不低于该值才视为同一函数
+MATCH_THRESHOLD = 0.7
+# token太少的函数（如单行属性访问）彼此高度相似，不参与匹配
+MIN_SHINGLES = 4
+
+_PRIME = (1 << 32) - 5
+_rng = np.random.RandomState(20240101)
+# 乘数小于2**31、shingle哈希小于2**32，乘积不会溢出uint64
+_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+def _is_docstring(stmt):
+    return (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+            and isinstance(stmt.value.value, str))
+
+def function_tokens(node):
+    """函数体的token序列：节点类型和标识符，按源码顺序；不含函数自身名称和文档字符串"""
+    tokens = []
+    stack = list(reversed(node.body[1:] if node.body and _is_docstring(node.body[0]) else node.body))
+    stack.extend(reversed(node.decorator_list))
+    stack.append(node.args)
+    while stack:
+        current = stack.pop()
+        tokens.append(type(current).__name__)
+        if isinstance(current, ast.Name):
+            tokens.append(current.id)
+        elif isinstance(current, ast.Attribute):
+            tokens.append(current.attr)
+        elif isinstance(current, ast.arg):
+            tokens.append(current.arg)
+        elif isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            tokens.append(current.name)
+        elif isinstance(current, ast.Constant):
+            tokens.append(repr(current.value)[:32])
+        stack.extend(reversed(list(ast.iter_child_nodes(current))))
+    return tokens
+
+def shingle_hashes(tokens, size=SHINGLE_SIZE):
+    """连续size个token组成的shingle集合，每个shingle映射为32位哈希"""
+    return {zlib.crc32("\x1f".join(tokens[i:i + size]).encode('utf-8'))
+            for i in range(max(len(tokens) - size + 1, 0))}
+
+def minhash(shingles):
+    """MinHash签名（十六进制字符串）；shingle不足MIN_SHINGLES时返回None"""
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    signature = ((_A[:, None] * values[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+    return signature.astype(">u4").tobytes().hex()
+
+def function_signature(node):
+    return minhash(shingle_hashes(function_tokens(node)))
+
+def _signature_array(signature):
+    return np.frombuffer(bytes.fromhex(signature), dtype=">u4")
+
+def estimated_similarity(signature1, signature2):
+    """两个签名中相同分量的比例，即Jaccard相似度的估计"""
+    return float(np.mean(_signature_array(signature1) == _signature_array(signature2)))
+
+class LSHIndex:
+    """把签名切成bands段，任一段完全相同的签名落入同一个桶，成为候选对
+
+    每个签名只在bands个桶中查找一次，整体近似线性；阈值约为 (1/bands)^(1/rows)。
+    """
+
+    def __init__(self, bands=LSH_BANDS):
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self.buckets = defaultdict(list)
+
+    def _keys(self, signature):
+        width = self.rows * 8
+        return [(band, signature[band * width:(band + 1) * width]) for band in range(self.bands)]
+
+    def add(self, key, signature):
+        for bucket in self._keys(signature):
+            self.buckets[bucket].append(key)
+
+    def candidates(self, signature):
+        found = set()
+        for bucket in self._keys(signature):
+            found.update(self.buckets.get(bucket, ()))
+        return found
+
+def _split(name):
+    """"文件::限定名" -> (文件, 最后一级名称)"""
+    rel_path, _, qualified = name.partition("::")
+    return rel_path, qualified.split("#")[0].rsplit(".", 1)[-1]
+
+def _kind(old_name, new_name):
+    old_file, old_short = _split(old_name)
+    new_file, new_short = _split(new_name)
+    if old_file != new_file and old_short != new_short:
+        return "moved_renamed"
+    if old_file != new_file:
+        return "moved"
+    return "renamed"
+
+def match_functions(removed, added, threshold=MATCH_THRESHOLD):
+    """把删除的函数与新增的函数配对
+
+    removed/added为 名称 -> (结构哈希, MinHash签名)。结构哈希相同的直接配对（相似度1.0），
+    其余经LSH取候选并按估计相似度从高到低一对一贪心配对。
+    """
+    pairs = []
+    matched_old, matched_new = set(), set()
+
+    by_hash = defaultdict(list)
+    for name, (structure_hash, signature) in sorted(added.items()):
+        if signature is not None:
+            by_hash[structure_hash].append(name)
+    for name, (structure_hash, signature) in sorted(removed.items()):
+        if signature is None:
+            continue
+        candidates = [n for n in by_hash.get(structure_hash, ()) if n not in matched_new]
+        if candidates:
+            short = _split(name)[1]
+            new_name = next((n for n in candidates if _split(n)[1] == short), candidates[0])
+            pairs.append((1.0, name, new_name))
+            matched_old.add(name)
+            matched_new.add(new_name)
+
+    index = LSHIndex()
+    for name, (_, signature) in added.items():
+        if name not in matched_new and signature is not None:
+            index.add(name, signature)
+    scored = []
+    for name, (_, signature) in removed.items():
+        if name in matched_old or signature is None:
+            continue
+        for new_name in index.candidates(signature):
+            score = estimated_similarity(signature, added[new_name][1])
+            if score >= threshold:
+                # 同分时优先名称相同（跨模块移动）的候选
+                same_name = _split(name)[1] == _split(new_name)[1]
+                scored.append((score, same_name, name, new_name))
+    for score, _, name, new_name in sorted(scored, reverse=True):
+        if name not in matched_old and new_name not in matched_new:
+            pairs.append((score, name, new_name))
+            matched_old.add(name)
+            matched_new.add(new_name)
+
+    return [{"from": old_name, "to": new_name, "kind": _kind(old_name, new_name),
+             "similarity": round(score, 3)}
+            for score, old_name, new_name in sorted(pairs, key=lambda p: (p[1], p[2]))]
+
+def _function_entries(structure, names):
+    entries = {}
+    for name in names:
+        rel_path, _, qualified = name.partition("::")
+        info = structure["files"][rel_path]
+        entries[name] = (info["functions"][qualified], info.get("signatures", {}).get(qualified))
+    return entries
+
+def detect_moves(old_structure, new_structure, diff, threshold=MATCH_THRESHOLD):
+    """在diff_structures的结果中找出移动或改名的函数（原本报告为一删一增）"""
+    removed = _function_entries(old_structure, diff["functions"]["removed"])
+    added = _function_entries(new_structure, diff["functions"]["added"])
+    return match_functions(removed, added, threshold)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+结构哈希 - 为函数、类、文件和包计算规范化AST的Merkle哈希，用于快速定位版本间的变化
+"""
+
+import os
+import ast
+import posixpath
+import json
+import hashlib
+
+from static_analysis.import_graph import version_relpath
+
+STRUCTURE_FILE = "structure_hashes.json"
+
+_DEF_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_BODY_FIELDS = frozenset(("body", "orelse", "finalbody", "handlers", "cases"))
+# 不影响结构的字段：定义自身的名称（由上层连同子哈希一起计入）和类型注释
+_IGNORED_FIELDS = frozenset(("name", "type_comment"))
+
+def _is_docstring(stmt):
+    return (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+            and isinstance(stmt.value.value, str))
+
+def _dump(value):
+    if isinstance(value, ast.AST):
+        return ast.dump(value, annotate_fields=False)
+    if isinstance(value, list):
+        return "[" + ",".join(_dump(item) for item in value) + "]"
+    return repr(value)
+
+class StructuralHasher:
+    """规范化AST的Merkle哈希
+
+    规范化去掉行列位置、注释、格式和文档字符串。函数/类的哈希由其自身结构和
+    嵌套定义的子哈希组合而成，不含自身名称（名称由上层与子哈希一起计入），
+    因此只改名的定义哈希不变，而任何嵌套定义的变化都会向上传递到文件哈希。
+    同一棵树上已计算过的定义按节点缓存，先算内层再算外层时每个节点只处理一次。
+    """
+
+    def __init__(self):
+        self._hashes = {}
+
+    def hash(self, node):
+        """返回函数、类或模块节点的结构哈希（32位十六进制）"""
+        cached = self._hashes.get(id(node))
+        if cached is not None:
+            return cached[0]
+        digest = hashlib.blake2b(digest_size=16)
+        self._feed(node, digest)
+        value = digest.hexdigest()
+        # 同时保存节点引用，避免节点被回收后id被复用
+        self._hashes[id(node)] = (value, node)
+        return value
+
+    def _feed(self, node, digest):
+        update = digest.update
+        update(type(node).__name__.encode('ascii'))
+        for field, value in ast.iter_fields(node):
+            if field in _IGNORED_FIELDS and isinstance(node, _DEF_NODES):
+                continue
+            if field not in _BODY_FIELDS:
+                update(f"|{field}={_dump(value)}".encode('utf-8'))
+                continue
+            body = value
+            if field == "body" and isinstance(node, _DEF_NODES + (ast.Module,)) and body and _is_docstring(body[0]):
+                body = body[1:]
+            update(f"|{field}[".encode('ascii'))
+            for child in body:
+                if isinstance(child, _DEF_NODES):
+                    update(f"{type(child).__name__}:{child.name}:{self.hash(child)};".encode('utf-8'))
+                elif _BODY_FIELDS.intersection(child._fields):
+                    # 复合语句（if/for/try/with/match分支）内联展开，其中的定义仍按子哈希计入
+                    self._feed(child, digest)
+                    update(b";")
+                else:
+                    update(_dump(child).encode('utf-8'))
+                    update(b";")
+            update(b"]")
+
+def _combine(children):
+    """按名称排序后合并子节点哈希（包 = 其下文件和子包）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, value in sorted(children.items()):
+        digest.update(f"{name}:{value};".encode('utf-8'))
+    return digest.hexdigest()
+
+def qualified_names(records):
+    """按记录顺序返回限定名，同一文件内重名的定义（如条件定义、property setter）加 #序号 区分"""
+    seen = {}
+    names = []
+    for record in records:
+        name = f"{record['scope']}.{record['name']}" if record.get("scope") else record["name"]
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}#{seen[name]}"
+        names.append(name)
+    return names
+
+class StructureHashWriter:
+    """接收每个文件分析结果的监听器，结束时把文件哈希逐级合并到包并保存
+
+    只在分析器开启结构哈希模式（FlaskASTAnalyzer(structure=True)）时使用，
+    文件结果中的 structure 键已包含文件、函数和类的哈希以及函数的MinHash签名。
+    """
+
+    def __init__(self, version_name, output_file):
+        self.version_name = version_name
+        self.output_file = output_file
+        self.files = {}
+
+    def write_file_result(self, result):
+        structure = result.get("structure")
+        if structure is None:
+            return
+        rel_path = version_relpath(result["file_stats"]["file"], self.version_name)
+        self.files[rel_path] = structure
+
+    def packages(self):
+        """目录 -> {"hash", "dirs", "files"}，"" 为整个版本
+
+        目录的哈希由其下文件和子目录的哈希合并而成，同时记录直接子目录和文件，
+        对比时可自顶向下遍历并整棵跳过哈希相同的子树。
+        """
+        tree = {"": ([], [])}
+
+        def node_of(directory):
+            node = tree.get(directory)
+            if node is None:
+                node = tree[directory] = ([], [])
+                node_of(posixpath.dirname(directory))[0].append(directory)
+            return node
+
+        for rel_path in sorted(self.files):
+            node_of(posixpath.dirname(rel_path))[1].append(rel_path)
+
+        packages = {}
+
+        def package_hash(directory):
+            dirs, files = tree[directory]
+            entries = {posixpath.basename(f): self.files[f]["hash"] for f in files}
+            for sub in dirs:
+                entries[posixpath.basename(sub) + "/"] = package_hash(sub)
+            packages[directory] = {"hash": _combine(entries), "dirs": sorted(dirs), "files": files}
+            return packages[directory]["hash"]
+
+        package_hash("")
+        return packages
+
+    def close(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_file)), exist_ok=True)
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            json.dump({"packages": self.packages(), "files": self.files}, f, ensure_ascii=False)
+
+def load_structure(version_dir):
+    """读取版本输出目录下的结构哈希，不存在时返回None"""
+    structure_file = os.path.join(version_dir, STRUCTURE_FILE)
+    if not os.path.exists(structure_file):
+        return None
+    with open(structure_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _diff_definitions(old, new, rel_path, changes):
+    for name, value in new.items():
+        if name not in old:
+            changes["added"].append(f"{rel_path}::{name}")
+        elif old[name] != value:
+            changes["modified"].append(f"{rel_path}::{name}")
+    for name in old:
+        if name not in new:
+            changes["removed"].append(f"{rel_path}::{name}")
+
+def diff_structures(old, new):
+    """按Merkle哈希对比两个版本的结构
+
+    自顶向下比较：哈希相同的包整棵跳过，哈希相同的文件不比较其中的定义，
+    只在哈希不同的文件中逐个对比函数和类。返回新增、删除、修改的文件、函数和类（文件::限定名）。
+    """
+    old_packages, new_packages = old["packages"], new["packages"]
+    old_files, new_files = old["files"], new["files"]
+    diff = {
+        "identical": old_packages[""]["hash"] == new_packages[""]["hash"],
+        "files_compared": 0,
+        "files_skipped": 0,
+        "added_files": [],
+        "removed_files": [],
+        "modified_files": [],
+        "functions": {"added": [], "removed": [], "modified": []},
+        "classes": {"added": [], "removed": [], "modified": []},
+    }
+    empty = {"hash": None, "functions": {}, "classes": {}}
+    missing = {"hash": None, "dirs": [], "files": []}
+
+    def walk(directory):
+        old_package = old_packages.get(directory, missing)
+        new_package = new_packages.get(directory, missing)
+        if old_package["hash"] == new_package["hash"]:
+            return
+        for rel_path in sorted(set(old_package["files"]) | set(new_package["files"])):
+            old_info, new_info = old_files.get(rel_path), new_files.get(rel_path)
+            if old_info is None:
+                diff["added_files"].append(rel_path)
+            elif new_info is None:
+                diff["removed_files"].append(rel_path)
+            elif old_info["hash"] != new_info["hash"]:
+                diff["modified_files"].append(rel_path)
+            else:
+                continue
+            diff["files_compared"] += 1
+            old_info, new_info = old_info or empty, new_info or empty
+            _diff_definitions(old_info["functions"], new_info["functions"], rel_path, diff["functions"])
+            _diff_definitions(old_info["classes"], new_info["classes"], rel_path, diff["classes"])
+        for sub in sorted(set(old_package["dirs"]) | set(new_package["dirs"])):
+            walk(sub)
+
+    walk("")
+    diff["files_skipped"] = len(new_files) - len(diff["added_files"]) - len(diff["modified_files"])
+    return diff
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+符号索引 - 基于SQLite的跨版本函数/类/装饰器/导入查询
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    version_id INTEGER NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    version_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    scope TEXT,
+    line INTEGER,
+    lines INTEGER,
+    args INTEGER,
+    is_async INTEGER,
+    is_method INTEGER
+);
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    version_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    scope TEXT,
+    line INTEGER,
+    methods INTEGER,
+    bases TEXT
+);
+CREATE TABLE IF NOT EXISTS decorators (
+    function_id INTEGER NOT NULL,
+    version_id INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    version_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    module TEXT,
+    name TEXT,
+    alias TEXT,
+    level INTEGER,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_version ON files(version_id, path);
+CREATE INDEX IF NOT EXISTS idx_functions_name ON functions(name, version_id);
+CREATE INDEX IF NOT EXISTS idx_functions_file ON functions(file_id);
+CREATE INDEX IF NOT EXISTS idx_classes_name ON classes(name, version_id);
+CREATE INDEX IF NOT EXISTS idx_classes_file ON classes(file_id);
+CREATE INDEX IF NOT EXISTS idx_decorators_name ON decorators(name, version_id);
+CREATE INDEX IF NOT EXISTS idx_decorators_function ON decorators(function_id);
+CREATE INDEX IF NOT EXISTS idx_imports_module ON imports(module, version_id);
+CREATE INDEX IF NOT EXISTS idx_imports_file ON imports(file_id);
+"""
+
+class SymbolIndex:
+    """SQLite符号索引，按版本存储分析结果并提供查询接口"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _next_id(self, table):
+        row = self.conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()
+        return row[0]
+
+    def reset_version(self, version):
+        """删除某版本的全部记录并返回新的版本id"""
+        cur = self.conn.cursor()
+        row = cur.execute("SELECT id FROM versions WHERE name = ?", (version,)).fetchone()
+        if row is not None:
+            version_id = row[0]
+            for table in ("decorators", "imports", "functions", "classes", "files"):
+                cur.execute(f"DELETE FROM {table} WHERE version_id = ?", (version_id,))
+        else:
+            cur.execute("INSERT INTO versions (name) VALUES (?)", (version,))
+            version_id = cur.lastrowid
+        self.conn.commit()
+        return version_id
+
+    def writer(self, version, batch_size=200):
+        """返回写入某版本的sink，可挂到FlaskASTAnalyzer上"""
+        return SymbolIndexWriter(self, version, batch_size)
+
+    def ingest_stats(self, version, stats):
+        """导入FlaskASTAnalyzer.stats结构（如ast_analysis_detailed.json）"""
+        writer = self.writer(version)
+        writer.write_file_result(stats)
+        writer.close()
+        return writer.counts
+
+    def ingest_analysis_dir(self, analysis_dir):
+        """导入静态分析输出目录下所有版本的明细结果（JSON或JSONL）"""
+        ingested = {}
+        for version in sorted(os.listdir(analysis_dir)):
+            version_dir = os.path.join(analysis_dir, version)
+            json_file = os.path.join(version_dir, "ast_analysis_detailed.json")
+            jsonl_file = os.path.join(version_dir, "ast_analysis_detailed.jsonl")
+            if os.path.exists(jsonl_file):
+                from static_analysis.result_stream import iter_records, RECORD_KINDS
+                writer = self.writer(version)
+                for kind, key in RECORD_KINDS.items():
+                    batch = {"function_details": [], "class_details": [], "import_details": []}
+                    for record in iter_records(jsonl_file, kind):
+                        batch[key].append(record)
+                        if len(batch[key]) >= 1000:
+                            writer.write_file_result(batch)
+                            batch[key] = []
+                    writer.write_file_result(batch)
+                writer.close()
+                ingested[version] = writer.counts
+            elif os.path.exists(json_file):
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    ingested[version] = self.ingest_stats(version, json.load(f))
+        return ingested
+
+    # ---- 查询接口 ----
+
+    def versions(self):
+        return [row["name"] for row in self.conn.execute("SELECT name FROM versions ORDER BY id")]
+
+    def find_functions(self, name, version=None):
+        """按函数名查询各版本中的定义位置和长度"""
+        sql = """
+            SELECT v.name AS version, f.path AS file, fn.scope, fn.name, fn.line,
+                   fn.lines, fn.args, fn.is_async
+            FROM functions fn
+            JOIN versions v ON v.id = fn.version_id
+            JOIN files f ON f.id = fn.file_id
+            WHERE fn.name = ?
+        """
+        params = [name]
+        if version is not None:
+            sql += " AND v.name = ?"
+            params.append(version)
+        sql += " ORDER BY v.id, f.path, fn.line"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def find_classes(self, name, version=None):
+        sql = """
+            SELECT v.name AS version, f.path AS file, c.scope, c.name, c.line, c.methods, c.bases
+            FROM classes c
+            JOIN versions v ON v.id = c.version_id
+            JOIN files f ON f.id = c.file_id
+            WHERE c.name = ?
+        """
+        params = [name]
+        if version is not None:
+            sql += " AND v.name = ?"
+            params.append(version)
+        sql += " ORDER BY v.id, f.path, c.line"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def find_decorated(self, decorator, version=None):
+        """查询使用某装饰器的函数"""
+        sql = """
+            SELECT v.name AS version, f.path AS file, fn.name, fn.line, d.name AS decorator
+            FROM decorators d
+            JOIN functions fn ON fn.id = d.function_id
+            JOIN versions v ON v.id = d.version_id
+            JOIN files f ON f.id = fn.file_id
+            WHERE d.name = ?
+        """
+        params = [decorator]
+        if version is not None:
+            sql += " AND v.name = ?"
+            params.append(version)
+        sql += " ORDER BY v.id, f.path, fn.line"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def find_importers(self, module, version=None):
+        """查询导入某模块的文件"""
+        sql = """
+            SELECT v.name AS version, f.path AS file, i.module, i.name, i.alias, i.level
+            FROM imports i
+            JOIN versions v ON v.id = i.version_id
+            JOIN files f ON f.id = i.file_id
+            WHERE i.module = ?
+        """
+        params = [module]
+        if version is not None:
+            sql += " AND v.name = ?"
+            params.append(version)
+        sql += " ORDER BY v.id, f.path"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+class SymbolIndexWriter:
+    """把单文件分析结果批量写入SymbolIndex的sink
+
+    记录先缓存在内存中，每batch_size个文件在一个事务内用executemany写入。
+    函数id在写入端分配，装饰器行据此关联函数而无需逐行查询。
+    """
+
+    def __init__(self, index, version, batch_size=200):
+        self.index = index
+        self.conn = index.conn
+        self.version = version
+        self.batch_size = batch_size
+        self.version_id = index.reset_version(version)
+        self._next_file_id = index._next_id("files")
+        self._next_function_id = index._next_id("functions")
+        self._file_ids = {}
+        self._pending_files = 0
+        self._rows = {"files": [], "functions": [], "classes": [], "decorators": [], "imports": []}
+        self.counts = {"files": 0, "functions": 0, "classes": 0, "imports": 0}
+        self._closed = False
+
+    def _file_id(self, path):
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = self._next_file_id
+            self._next_file_id += 1
+            self._file_ids[path] = file_id
+            self._rows["files"].append((file_id, self.version_id, path))
+            self.counts["files"] += 1
+        return file_id
+
+    def write_file_result(self, result):
+        version_id = self.version_id
+        rows = self._rows
+        for func in result["function_details"]:
+            function_id = self._next_function_id
+            self._next_function_id += 1
+            rows["functions"].append((
+                function_id, version_id, self._file_id(func["file"]), func["name"],
+                func.get("scope"), func["line"], func["lines"], func["args"],
+                int(func.get("is_async", False)), int(func.get("is_method", False))
+            ))
+            for decorator in func.get("decorators", []):
+                rows["decorators"].append((function_id, version_id, decorator))
+        for cls in result["class_details"]:
+            rows["classes"].append((
+                version_id, self._file_id(cls["file"]), cls["name"], cls.get("scope"),
+                cls["line"], cls["methods"], ",".join(cls.get("bases", []))
+            ))
+        for imp in result["import_details"]:
+            file_id = self._file_id(imp["file"])
+            for item in imp["imports"]:
+                rows["imports"].append((
+                    version_id, file_id, item.get("module"), item.get("name"),
+                    item.get("alias"), item.get("level"), item.get("type")
+                ))
+        self.counts["functions"] += len(result["function_details"])
+        self.counts["classes"] += len(result["class_details"])
+        self.counts["imports"] += len(result["import_details"])
+
+        self._pending_files += 1
+        if self._pending_files >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """在一个事务内批量写入缓存的记录"""
+        rows = self._rows
+        with self.conn:
+            self.conn.executemany("INSERT INTO files (id, version_id, path) VALUES (?, ?, ?)",
+                                  rows["files"])
+            self.conn.executemany(
+                "INSERT INTO functions (id, version_id, file_id, name, scope, line, lines, args, "
+                "is_async, is_method) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows["functions"])
+            self.conn.executemany(
+                "INSERT INTO classes (version_id, file_id, name, scope, line, methods, bases) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows["classes"])
+            self.conn.executemany(
+                "INSERT INTO decorators (function_id, version_id, name) VALUES (?, ?, ?)",
+                rows["decorators"])
+            self.conn.executemany(
+                "INSERT INTO imports (version_id, file_id, module, name, alias, level, type) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows["imports"])
+        for table in rows.values():
+            table.clear()
+        self._pending_files = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+
+def _print_rows(rows):
+    if not rows:
+        print("未找到匹配记录")
+        return
+    columns = list(rows[0].keys())
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if row[c] is None else str(row[c]) for c in columns))
+    print(f"共 {len(rows)} 条")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flask符号索引查询")
+    parser.add_argument("--db", required=True, help="SQLite索引文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="导入静态分析输出目录")
+    ingest.add_argument("analysis_dir")
+
+    for command, help_text in (("function", "按函数名查询"), ("class", "按类名查询"),
+                               ("decorator", "按装饰器查询"), ("imports", "按模块查询导入方")):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("name")
+        sub.add_argument("--version", default=None)
+
+    subparsers.add_parser("versions", help="列出已索引的版本")
+
+    args = parser.parse_args(argv)
+    with SymbolIndex(args.db) as index:
+        if args.command == "ingest":
+            for version, counts in index.ingest_analysis_dir(args.analysis_dir).items():
+                print(f"{version}: {counts}")
+        elif args.command == "versions":
+            for version in index.versions():
+                print(version)
+        else:
+            query = {
+                "function": index.find_functions,
+                "class": index.find_classes,
+                "decorator": index.find_decorated,
+                "imports": index.find_importers,
+            }[args.command]
+            _print_rows(query(args.name, args.version))
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
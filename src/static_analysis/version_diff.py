@@ -5,11 +5,21 @@
 """
 
 import os
+import re
 import json
-from collections import defaultdict
+import numpy as np
 
-def compare_versions(version1_stats, version2_stats, version1_name, version2_name):
-    """比较两个版本的统计信息"""
+from static_analysis.columnar_store import has_columnar, load_totals
+from static_analysis.structural_hash import load_structure, diff_structures
+from static_analysis.similarity import detect_moves
+
+def compare_versions(version1_stats, version2_stats, version1_name, version2_name,
+                     version1_structure=None, version2_structure=None):
+    """比较两个版本的统计信息
+    
+    给出两个版本的结构哈希（见structural_hash.load_structure）时，
+    同时按哈希找出新增、删除和修改的函数与类。
+    """
     comparison = {
         "version1": version1_name,
         "version2": version2_name,
@@ -40,134 +50,264 @@ def compare_versions(version1_stats, version2_stats, version1_name, version2_nam
         "change": f"{v2_density - v1_density:.2f}"
     }
     
+    if version1_structure is not None and version2_structure is not None:
+        comparison["structure"] = diff_structures(version1_structure, version2_structure)
+    
     return comparison
 
-def analyze_version_evolution(analysis_dir):
-    """分析版本演化趋势"""
-    print("分析版本演化趋势...")
+SUMMARY_FILE = "ast_analysis_summary.json"
+EVOLUTION_METRICS = ("total_files", "total_functions", "total_classes", "total_imports",
+                     "avg_functions_per_file", "avg_classes_per_file")
+
+def version_sort_key(version_name):
+    """flask_2.10.0 排在 flask_2.9.0 之后；非数字部分（如rc1）按字符串比较"""
+    version = version_name.split("_", 1)[-1]
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part)
+            for part in re.split(r"[.\-]", version)]
+
+def _load_totals(version_path):
+    """读取版本的汇总数，旧输出的摘要中没有 total_* 时改从列式清单或详细结果计算"""
+    summary_file = os.path.join(version_path, SUMMARY_FILE)
+    with open(summary_file, 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+    if "total_functions" in summary:
+        return summary
     
-    # 查找所有版本的分析结果
-    version_summaries = {}
-    version_dirs = []
+    columnar_dir = os.path.join(version_path, "ast_columnar")
+    if has_columnar(columnar_dir):
+        stats = load_totals(columnar_dir)
+    else:
+        detailed_file = os.path.join(version_path, "ast_analysis_detailed.json")
+        if not os.path.exists(detailed_file):
+            return summary
+        with open(detailed_file, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    files = stats.get("files_analyzed", 0)
+    summary.update({
+        "total_files": files,
+        "total_functions": stats.get("total_functions", 0),
+        "total_classes": stats.get("total_classes", 0),
+        "total_imports": stats.get("total_imports", 0),
+        "avg_functions_per_file": stats.get("total_functions", 0) / max(files, 1),
+        "avg_classes_per_file": stats.get("total_classes", 0) / max(files, 1),
+    })
+    return summary
+
+def _json_values(array, decimals=4):
+    """NumPy数组转为可写入JSON的嵌套列表，NaN（基数为0的增长率）写为None"""
+    rounded = np.round(array.astype(np.float64), decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+class EvolutionMatrix:
+    """版本 × 指标矩阵（float64），各版本的摘要只读取一次
+
+    所有两两差值、增长率和滚动趋势都由矩阵运算一次得到，
+    上百个版本的完整演化矩阵也只需几毫秒。
+    """
     
-    for item in os.listdir(analysis_dir):
-        item_path = os.path.join(analysis_dir, item)
-        summary_file = os.path.join(item_path, "ast_analysis_summary.json")
-        
-        if os.path.isdir(item_path) and os.path.exists(summary_file):
+    def __init__(self, versions, values, metrics=EVOLUTION_METRICS, analysis_dir=None):
+        self.versions = list(versions)
+        self.metrics = list(metrics)
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.versions), len(self.metrics))
+        self.analysis_dir = analysis_dir
+    
+    @classmethod
+    def from_analysis_dir(cls, analysis_dir, metrics=EVOLUTION_METRICS):
+        """扫描一次分析输出目录，按版本号排序后构建矩阵"""
+        versions = []
+        rows = []
+        for item in sorted(os.listdir(analysis_dir), key=version_sort_key):
+            item_path = os.path.join(analysis_dir, item)
+            if not (os.path.isdir(item_path) and os.path.exists(os.path.join(item_path, SUMMARY_FILE))):
+                continue
             try:
-                with open(summary_file, 'r', encoding='utf-8') as f:
-                    summary = json.load(f)
-                version_summaries[item] = summary
-                version_dirs.append(item)
+                totals = _load_totals(item_path)
             except Exception as e:
-                print(f"读取 {summary_file} 失败: {e}")
+                print(f"读取 {item_path} 的摘要失败: {e}")
+                continue
+            versions.append(item)
+            rows.append([totals.get(metric, 0) for metric in metrics])
+        return cls(versions, np.array(rows, dtype=np.float64).reshape(len(versions), len(metrics)),
+                   metrics, analysis_dir)
+    
+    def __len__(self):
+        return len(self.versions)
+    
+    def column(self, metric):
+        return self.values[:, self.metrics.index(metric)]
+    
+    def pairwise_deltas(self):
+        """(版本, 版本, 指标)：[i, j] 为从版本i到版本j的变化量"""
+        return self.values[None, :, :] - self.values[:, None, :]
+    
+    def growth_rates(self):
+        """(版本, 版本, 指标)：[i, j] 为从版本i到版本j的相对增长率，基数为0时为NaN"""
+        base = np.broadcast_to(self.values[:, None, :], (len(self), len(self), len(self.metrics)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(base != 0, self.pairwise_deltas() / base, np.nan)
+    
+    def adjacent_deltas(self):
+        """相邻版本的变化量 (版本数-1, 指标)"""
+        return np.diff(self.values, axis=0)
+    
+    def adjacent_growth(self):
+        previous = self.values[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(previous != 0, self.adjacent_deltas() / previous, np.nan)
+    
+    def rolling_trend(self, window=3):
+        """滑动窗口内按最小二乘拟合的斜率（每个版本的平均变化量），形状 (版本数-window+1, 指标)"""
+        if len(self) < window:
+            return np.empty((0, len(self.metrics)))
+        windows = np.lib.stride_tricks.sliding_window_view(self.values, window, axis=0)
+        x = np.arange(window, dtype=np.float64) - (window - 1) / 2
+        return (windows - windows.mean(axis=-1, keepdims=True)) @ x / (x @ x)
+    
+    def to_dict(self, window=3):
+        """JSON友好的演化矩阵：原始值、相邻差值/增长率、相对首个版本的增长率和滚动趋势"""
+        growth = self.growth_rates()
+        return {
+            "versions": self.versions,
+            "metrics": self.metrics,
+            "values": _json_values(self.values),
+            "adjacent_deltas": _json_values(self.adjacent_deltas()),
+            "adjacent_growth": _json_values(self.adjacent_growth()),
+            "growth_from_first": _json_values(growth[0]) if len(self) else [],
+            "rolling_window": window,
+            "rolling_trend": _json_values(self.rolling_trend(window)),
+        }
     
-    # 按版本号排序
-    version_dirs.sort(key=lambda x: [int(v) if v.isdigit() else v for v in x.split('_')[1].split('.')])
+    def save(self, output_file):
+        """完整的两两差值和增长率矩阵保存为 .npz"""
+        np.savez_compressed(output_file, versions=np.array(self.versions), metrics=np.array(self.metrics),
+                            values=self.values, deltas=self.pairwise_deltas(), growth=self.growth_rates())
+
+def analyze_version_evolution(analysis_dir, matrix=None):
+    """分析版本演化趋势，可传入已加载的EvolutionMatrix避免重复读取"""
+    print("分析版本演化趋势...")
+    
+    if matrix is None:
+        matrix = EvolutionMatrix.from_analysis_dir(analysis_dir)
+    version_dirs = matrix.versions
     
     # 生成演化报告
     evolution = {
         "versions": version_dirs,
-        "trends": {}
+        "trends": {metric: matrix.column(metric).astype(np.int64).tolist()
+                   for metric in ("total_functions", "total_classes", "total_imports")},
+        "matrix": matrix.to_dict(),
     }
     
-    # 收集趋势数据
-    metrics = ["total_functions", "total_classes", "total_imports"]
-    for metric in metrics:
-        evolution["trends"][metric] = []
-        for version in version_dirs:
-            summary = version_summaries.get(version, {})
-            # 这里需要从详细统计中获取，简化处理
-            evolution["trends"][metric].append(summary.get(metric, 0))
-    
     # 生成版本间比较
+    functions = matrix.metrics.index("total_functions")
+    classes = matrix.metrics.index("total_classes")
+    deltas = matrix.adjacent_deltas()
+    growth = np.nan_to_num(matrix.adjacent_growth() * 100)
+    version_structures = {v: load_structure(os.path.join(analysis_dir, v)) for v in version_dirs}
     comparisons = []
     for i in range(len(version_dirs) - 1):
         v1 = version_dirs[i]
         v2 = version_dirs[i + 1]
         
-        # 简化比较：统计函数和类的数量变化
-        v1_funcs = version_summaries.get(v1, {}).get("total_functions", 0)
-        v2_funcs = version_summaries.get(v2, {}).get("total_functions", 0)
-        
-        v1_classes = version_summaries.get(v1, {}).get("total_classes", 0)
-        v2_classes = version_summaries.get(v2, {}).get("total_classes", 0)
-        
-        comparisons.append({
+        entry = {
             "from": v1,
             "to": v2,
-            "function_growth": v2_funcs - v1_funcs,
-            "class_growth": v2_classes - v1_classes,
-            "function_growth_percent": ((v2_funcs - v1_funcs) / v1_funcs * 100) if v1_funcs > 0 else 0
-        })
+            "function_growth": int(deltas[i, functions]),
+            "class_growth": int(deltas[i, classes]),
+            "function_growth_percent": float(growth[i, functions])
+        }
+        
+        # 按结构哈希定位具体变化的函数和类
+        if version_structures[v1] is not None and version_structures[v2] is not None:
+            entry["structure"] = diff_structures(version_structures[v1], version_structures[v2])
+            entry["moved_functions"] = detect_moves(version_structures[v1], version_structures[v2],
+                                                    entry["structure"])
+        
+        comparisons.append(entry)
     
     evolution["comparisons"] = comparisons
     
     return evolution
 
-def generate_evolution_report(analysis_dir, output_file):
-    """生成版本演化报告"""
+def _structure_changes(analysis_dir, versions):
+    """相邻版本的函数/类增删改数量，以及移动或改名的函数，缺少结构哈希的版本跳过"""
+    structures = {v: load_structure(os.path.join(analysis_dir, v)) for v in versions}
+    versions = [v for v in versions if structures[v] is not None]
+    changes = []
+    moves = []
+    for v1, v2 in zip(versions, versions[1:]):
+        diff = diff_structures(structures[v1], structures[v2])
+        moved = detect_moves(structures[v1], structures[v2], diff)
+        moves.append({"from": v1, "to": v2, "functions": moved})
+        changes.append({
+            "from": v1,
+            "to": v2,
+            "files_changed": len(diff["added_files"]) + len(diff["removed_files"]) + len(diff["modified_files"]),
+            "files_unchanged": diff["files_skipped"],
+            "functions": {kind: len(names) for kind, names in diff["functions"].items()},
+            "classes": {kind: len(names) for kind, names in diff["classes"].items()},
+            "functions_moved": len(moved),
+        })
+    return changes, moves
+
+def generate_evolution_report(analysis_dir, output_file, matrix=None):
+    """生成版本演化报告，同时在报告旁保存完整的演化矩阵（evolution_matrix.npz）"""
     print("生成版本演化报告...")
     
-    # 读取所有版本的AST分析摘要
-    version_data = {}
-    
-    for version_dir in os.listdir(analysis_dir):
-        version_path = os.path.join(analysis_dir, version_dir)
-        if os.path.isdir(version_path):
-            summary_file = os.path.join(version_path, "ast_analysis_summary.json")
-            if os.path.exists(summary_file):
-                try:
-                    with open(summary_file, 'r', encoding='utf-8') as f:
-                        version_data[version_dir] = json.load(f)
-                except:
-                    pass
+    if matrix is None:
+        matrix = EvolutionMatrix.from_analysis_dir(analysis_dir)
+    versions = matrix.versions
     
     # 生成报告
     report = {
-        "versions_analyzed": list(version_data.keys()),
+        "versions_analyzed": versions,
         "summary": {},
         "recommendations": []
     }
     
     # 分析趋势
-    if len(version_data) >= 2:
-        versions = sorted(version_data.keys())
+    if len(versions) >= 2:
         first_version = versions[0]
         last_version = versions[-1]
         
-        first_stats = version_data[first_version]
-        last_stats = version_data[last_version]
-        
-        # 计算变化
+        # 计算首末版本的变化
+        deltas = matrix.values[-1] - matrix.values[0]
+        growth = matrix.growth_rates()[0, -1]
         changes = {}
         for key in ["total_functions", "total_classes"]:
-            if key in first_stats and key in last_stats:
-                change = last_stats[key] - first_stats[key]
-                percent = (change / first_stats[key] * 100) if first_stats[key] > 0 else 0
-                changes[key] = {
-                    "from": first_stats[key],
-                    "to": last_stats[key],
-                    "change": change,
-                    "percent": f"{percent:.1f}%"
-                }
+            index = matrix.metrics.index(key)
+            percent = 0 if np.isnan(growth[index]) else growth[index] * 100
+            changes[key] = {
+                "from": int(matrix.values[0, index]),
+                "to": int(matrix.values[-1, index]),
+                "change": int(deltas[index]),
+                "percent": f"{percent:.1f}%"
+            }
         
         report["summary"] = {
             "first_version": first_version,
             "last_version": last_version,
             "changes": changes
         }
+        report["evolution_matrix"] = matrix.to_dict()
+        matrix.save(os.path.join(os.path.dirname(os.path.abspath(output_file)), "evolution_matrix.npz"))
         
         # 生成建议
         if changes.get("total_functions", {}).get("change", 0) > 50:
             report["recommendations"].append("函数数量显著增加，代码复杂度可能增加")
         if changes.get("total_classes", {}).get("change", 0) > 10:
             report["recommendations"].append("类数量增加，面向对象设计可能更加丰富")
+        
+        # 相邻版本间按结构哈希统计函数和类的增删改
+        structure_changes, moved_functions = _structure_changes(analysis_dir, versions)
+        if structure_changes:
+            report["structure_changes"] = structure_changes
+            # 删除+新增中实际是移动或改名的函数（MinHash/LSH相似度配对）
+            report["moved_functions"] = moved_functions
     
     # 保存报告
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(report, f, indent=2, ensure_ascii=False)
     
     print(f"演化报告已生成: {output_file}")
-    return report
\ No newline at end of file
+    return report